@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+
+def signature_fingerprint(signature) -> Dict[str, Any]:
+    """Stable description of a DSPy signature: name, instructions and field specs."""
+    fields = getattr(signature, "fields", None) or {}
+    return {
+        "name": signature.__name__,
+        "instructions": getattr(signature, "instructions", None) or signature.__doc__ or "",
+        "fields": {name: str(getattr(field, "json_schema_extra", field)) for name, field in fields.items()},
+    }
+
+
+def program_key(signature, trainset: List[Dict[str, Any]], optimizer_config: Dict[str, Any], model: str) -> str:
+    """Hash of everything that determines a compiled program's demos."""
+    payload = json.dumps({
+        "signature": signature_fingerprint(signature),
+        "trainset": trainset,
+        "optimizer": optimizer_config,
+        "model": model,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def strip_demo_fields(program, fields) -> int:
+    """Remove `fields` from every demo of `program` in place; returns how many demos changed."""
+    changed = 0
+    for predictor in program.predictors():
+        demos = []
+        for demo in predictor.demos:
+            if any(field in demo for field in fields):
+                changed += 1
+                demo = demo.without(*fields) if hasattr(demo, "without") else {
+                    k: v for k, v in demo.items() if k not in fields}
+            demos.append(demo)
+        predictor.demos = demos
+    return changed
+
+
+class CompiledProgramStore:
+    """Compiled DSPy programs on disk as `<root>/<name>-<key>.json`."""
+
+    def __init__(self, root: str = ".cache/compiled"):
+        self.root = root
+
+    def path(self, name: str, key: str) -> str:
+        return os.path.join(self.root, f"{name}-{key}.json")
+
+    def exists(self, name: str, key: str) -> bool:
+        return os.path.exists(self.path(name, key))
+
+    def load(self, name: str, key: str, program) -> bool:
+        """Load saved state into `program` in place; False if there is no usable entry."""
+        path = self.path(name, key)
+        if not os.path.exists(path):
+            return False
+        try:
+            program.load(path)
+            return True
+        except Exception as e:
+            print(f"Compiled program load error ({path}): {e}")
+            return False
+
+    def save(self, name: str, key: str, program, metadata: Optional[Dict[str, Any]] = None) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(name, key)
+        program.save(path)
+        if metadata:
+            with open(path[:-len(".json")] + ".meta.json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=2, default=str)
+        return path
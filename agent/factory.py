@@ -0,0 +1,35 @@
+from typing import Dict, List, Optional
+
+from agent.tracing import Tracer
+
+AGENT_KINDS = ("simple", "hybrid")
+
+# Model the hybrid agent's DSPy modules fall back to when a stage has no chain
+DEFAULT_DSPY_MODEL = "ollama/phi3.5:3.8b-mini-instruct-q4_K_M"
+
+
+def create_agent(kind: str = "simple", tracer: Optional[Tracer] = None, model_profile: str = "default",
+                 model_overrides: Optional[Dict[str, List[str]]] = None,
+                 api_base: str = "http://localhost:11434", **kwargs):
+    """Build an agent by name, importing only that agent's dependencies.
+
+    `simple` needs requests + the retrieval/SQLite tools; `hybrid` additionally
+    pulls in dspy and langgraph, so those are imported here and nowhere earlier.
+    """
+    from agent.model_config import SIMPLE_PROFILES, HYBRID_PROFILES, resolve_models
+
+    if kind == "hybrid":
+        import dspy
+        from agent.graph_hybrid import HybridAgent
+        dspy.settings.configure(lm=dspy.LM(model=DEFAULT_DSPY_MODEL, api_base=api_base))
+        models = resolve_models(HYBRID_PROFILES, model_profile, model_overrides)
+        return HybridAgent(tracer=tracer, models=models, api_base=api_base, **kwargs)
+
+    if kind == "simple":
+        from agent.simple_agent import SimpleAgent
+        models = resolve_models(SIMPLE_PROFILES, model_profile, model_overrides)
+        agent = SimpleAgent(tracer=tracer, models=models, **kwargs)
+        agent.api_url = f"{api_base.rstrip('/')}/api/generate"
+        return agent
+
+    raise ValueError(f"Unknown agent '{kind}', expected one of {AGENT_KINDS}")
@@ -3,7 +3,14 @@ from typing import TypedDict, Annotated, List, Dict, Any, Union
 from langgraph.graph import StateGraph, END
 from agent.dspy_signatures import Router, GenerateSQL, SynthesizeAnswer, ExtractConstraints, RepairSQL
 from agent.tools.sqlite_tool import SQLiteTool
+from agent.tools.kpi_engine import KPIEngine
 from agent.rag.retrieval import Retrieval
+from agent.repair_cache import RepairCache, normalize_sql
+from agent.tracing import NULL_TRACER
+from agent.prompt_budget import PromptBudget, fit_sql_result, fit_docs, estimate_tokens
+from agent.model_config import HYBRID_PROFILES
+from agent.compiled_store import CompiledProgramStore, program_key, strip_demo_fields
+from agent.trainsets import TRAINSETS, OPTIMIZER_CONFIGS, DEMO_EXCLUDED_FIELDS
 import json
 
 # Define the state
@@ -20,12 +27,27 @@ class AgentState(TypedDict):
     explanation: str
     repair_count: int
     error: str
+    pending_repair: Dict[str, Any]
 
 class HybridAgent:
-    def __init__(self):
+    def __init__(self, sql_candidates=1, tracer=None, models=None, api_base="http://localhost:11434", kpi_engine=False):
+        if sql_candidates > 1:
+            # Losing DSPy calls can't be aborted, so K candidates would keep K requests running
+            raise ValueError("HybridAgent doesn't support sql_candidates > 1; use the simple agent")
         self.sqlite_tool = SQLiteTool()
         self.retrieval = Retrieval()
         self.schema = self.sqlite_tool.get_schema()
+        self.repair_cache = RepairCache()
+        self.tracer = tracer or NULL_TRACER
+        # Answers recognised KPI questions from a columnar cache instead of LLM-written SQL
+        self.kpi_engine = KPIEngine() if kpi_engine else None
+        # DSPy adds signature instructions and field headers on top of our inputs
+        self.budget = PromptBudget(num_ctx=4096, reserve_tokens=1024)
+        # Per-stage LM chains (primary, then fallback/escalation); unset stages use the global LM
+        self.models = models or HYBRID_PROFILES["default"]
+        self.api_base = api_base
+        self._lms = {}
+        self._graph = None
         
         # DSPy Modules
         self.router = dspy.ChainOfThought(Router)
@@ -34,8 +56,78 @@ class HybridAgent:
         self.synthesizer = dspy.ChainOfThought(SynthesizeAnswer)
         self.sql_repairer = dspy.ChainOfThought(RepairSQL)
         
+        # Swap in programs compiled by optimization.py when they match this setup
+        self.compiled_store = CompiledProgramStore()
+        self._load_compiled_programs()
+        
+    def _stage_model(self, stage: str) -> str:
+        chain = self.models.get(stage)
+        return chain[0] if chain else getattr(dspy.settings.lm, "model", "")
+
+    def _load_compiled_programs(self):
+        programs = (("router", Router), ("sql_generator", GenerateSQL), ("synthesizer", SynthesizeAnswer))
+        for name, signature in programs:
+            key = program_key(signature, TRAINSETS[name], OPTIMIZER_CONFIGS[name], self._stage_model(name))
+            program = getattr(self, name)
+            if self.compiled_store.load(name, key, program):
+                # Programs saved before demo fields were stripped still carry them
+                strip_demo_fields(program, DEMO_EXCLUDED_FIELDS.get(name, ()))
+                print(f"Loaded compiled {name} ({key})")
+
+    def _lm_chain(self, stage: str) -> List[Any]:
+        chain = []
+        for name in self.models.get(stage) or []:
+            if name not in self._lms:
+                self._lms[name] = dspy.LM(model=name, api_base=self.api_base)
+            chain.append(self._lms[name])
+        return chain or [None]
+
+    def _predict(self, stage: str, module, escalate: int = 0, fallback: bool = True, **kwargs):
+        """Run a DSPy module on the stage's model chain, starting `escalate` models in.
+
+        Each model that raises hands over to the next one in the chain. With
+        `fallback=False` only the model at `escalate` is called.
+        """
+        chain = self._lm_chain(stage)
+        start = min(escalate, len(chain) - 1)
+        last_error = None
+        for lm in chain[start:] if fallback else chain[start:start + 1]:
+            active = lm or dspy.settings.lm
+            try:
+                # Usage is tracked per prediction (context-local), not read from the shared,
+                # size-capped lm.history that other threads also append to
+                with dspy.context(lm=active, track_usage=True):
+                    pred = module(**kwargs)
+            except Exception as e:
+                print(f"LLM Call Error ({getattr(active, 'model', 'default')}): {e}")
+                self.tracer.annotate(llm_errors=1)
+                last_error = e
+                continue
+            self._annotate_usage(pred, active)
+            return pred
+        raise last_error
+
+    def _annotate_usage(self, pred, lm):
+        """Attribute the token usage of this prediction's LM calls to the current span."""
+        try:
+            usage = pred.get_lm_usage() or {}
+        except Exception:
+            usage = {}
+        if not usage:
+            # Served from DSPy's cache or the LM reported nothing
+            self.tracer.annotate(llm_calls=1, model=getattr(lm, "model", "default"))
+            return
+        for model, entry in usage.items():
+            entry = entry or {}
+            self.tracer.annotate(
+                llm_calls=1,
+                model=model,
+                prompt_tokens=entry.get("prompt_tokens") or 0,
+                response_tokens=entry.get("completion_tokens") or 0
+            )
+
     def router_node(self, state: AgentState) -> AgentState:
-        pred = self.router(question=state["question"])
+        pred = self._predict("router", self.router, question=state["question"])
         return {"tool_choice": pred.tool.lower()}
 
     def retriever_node(self, state: AgentState) -> AgentState:
@@ -43,8 +135,8 @@ class HybridAgent:
         return {"retrieved_docs": docs}
 
     def planner_node(self, state: AgentState) -> AgentState:
-        docs_str = json.dumps(state["retrieved_docs"], indent=2)
-        pred = self.planner(question=state["question"], retrieved_docs=docs_str)
+        docs_str = fit_docs(state["retrieved_docs"], self.budget.available(state["question"]))
+        pred = self._predict("planner", self.planner, question=state["question"], retrieved_docs=docs_str)
         constraints = {
             "date_range": pred.date_range,
             "kpi_formula": pred.kpi_formula,
@@ -52,37 +144,93 @@ class HybridAgent:
         }
         return {"constraints": constraints}
 
-    def sql_generator_node(self, state: AgentState) -> AgentState:
+    def _generate_sql(self, question: str, escalate: int = 0, fallback: bool = True) -> str:
         # Simplified call - removed constraints to reduce noise
         try:
-            pred = self.sql_generator(
-                question=state["question"],
+            pred = self._predict(
+                "sql_generator",
+                self.sql_generator,
+                escalate,
+                fallback,
+                question=question,
                 db_schema=self.schema
             )
             # Clean SQL: remove markdown code blocks if present
-            sql = pred.sql_query.replace("```sql", "").replace("```", "").strip()
+            return pred.sql_query.replace("```sql", "").replace("```", "").strip()
         except:
-            sql = "" # Fallback if generation fails
-            
-        return {"sql_query": sql}
+            return "" # Fallback if generation fails
+
+    def sql_generator_node(self, state: AgentState) -> AgentState:
+        if self.kpi_engine:
+            with self.tracer.span("kpi_engine"):
+                kpi = self.kpi_engine.answer(state["question"])
+            if kpi:
+                # Already a result; route_after_generator skips the executor
+                sql, result = kpi
+                return {"sql_query": sql, "sql_result": result, "error": ""}
+
+        # Move up the model chain only when the SQL is empty or fails to execute,
+        # calling exactly one model per level (as SimpleAgent._generate_with_escalation)
+        sql, result = "", {}
+        for level in range(len(self._lm_chain("sql_generator"))):
+            if level > 0:
+                self.tracer.annotate(escalations=1)
+            candidate = self._generate_sql(state["question"], escalate=level, fallback=False)
+            if not candidate:
+                continue
+            sql, result = candidate, self.sqlite_tool.execute_query(candidate)
+            if not result["error"]:
+                # Already executed; route_after_generator skips the executor
+                return {"sql_query": sql, "sql_result": result, "error": ""}
+        if not result:
+            return {"sql_query": sql}
+        # Every level failed to execute: hand the last failure to repair
+        return {"sql_query": sql, "sql_result": result, "error": result["error"]}
 
     def executor_node(self, state: AgentState) -> AgentState:
         result = self.sqlite_tool.execute_query(state["sql_query"])
+        pending = state.get("pending_repair")
         if result["error"]:
-            return {"sql_result": result, "error": result["error"]}
-        return {"sql_result": result, "error": ""}
+            if pending and pending.get("cached"):
+                # A cached fix that no longer works must not be replayed. Hand the original
+                # failure straight to RepairSQL; the cached attempt used no repair_count slot.
+                self.repair_cache.evict(pending["sql_query"], pending["error"])
+                return {"sql_query": pending["sql_query"], "sql_result": result, "error": pending["error"],
+                        "pending_repair": {"cache_failed": True}}
+            return {"sql_result": result, "error": result["error"], "pending_repair": {}}
+        if pending and pending.get("cached"):
+            self.repair_cache.confirm()
+        elif pending:
+            # A repaired query just ran cleanly: remember the fix for next time
+            self.repair_cache.store(pending["sql_query"], pending["error"], state["sql_query"])
+        return {"sql_result": result, "error": "", "pending_repair": {}}
 
     def synthesizer_node(self, state: AgentState) -> AgentState:
-        docs_str = json.dumps(state["retrieved_docs"], indent=2)
-        sql_result_str = json.dumps(state["sql_result"], indent=2)
+        sql_result = state.get("sql_result") or {}
+        docs = state["retrieved_docs"]
+        available = self.budget.available(state["question"], state["format_hint"], state.get("sql_query") or "")
+        
+        # Share the budget between SQL rows and docs; whichever needs less gives up the rest
+        full_docs = fit_docs(docs, available)
+        full_rows = fit_sql_result(sql_result, available) if sql_result.get("rows") else ""
+        shares = self.budget.split(
+            available,
+            {"sql": 0.6, "docs": 0.4},
+            {"sql": estimate_tokens(full_rows), "docs": estimate_tokens(full_docs)}
+        )
+        docs_str = fit_docs(docs, shares["docs"])
         
         # Add helpful context about the SQL result structure
-        if state["sql_result"].get("rows") and len(state["sql_result"]["rows"]) > 0:
-            sql_result_str = f"SQL Results (extract actual values from 'rows'):\n{sql_result_str}"
-        elif state["sql_result"].get("error"):
-            sql_result_str = f"SQL Error: {state['sql_result']['error']}\nUse retrieved_docs to answer."
+        if sql_result.get("rows") and len(sql_result["rows"]) > 0:
+            sql_result_str = f"SQL Results (CSV, header first):\n{fit_sql_result(sql_result, shares['sql'])}"
+        elif sql_result.get("error"):
+            sql_result_str = f"SQL Error: {sql_result['error']}\nUse retrieved_docs to answer."
+        else:
+            sql_result_str = "No SQL result."
         
-        pred = self.synthesizer(
+        pred = self._predict(
+            "synthesizer",
+            self.synthesizer,
             question=state["question"],
             format_hint=state["format_hint"],
             sql_query=state["sql_query"],
@@ -118,34 +266,58 @@ class HybridAgent:
         }
 
     def repair_node(self, state: AgentState) -> AgentState:
-        """Use RepairSQL to fix the query based on the error message."""
+        """Fix the query from the repair cache, falling back to RepairSQL on a miss."""
+        failure = {"sql_query": state["sql_query"], "error": state["error"]}
+        cached_sql = None
+        if not (state.get("pending_repair") or {}).get("cache_failed"):
+            cached_sql = self.repair_cache.lookup(state["sql_query"], state["error"])
+        self.tracer.annotate(retries=1, cache_hits=1 if cached_sql else 0)
+        if cached_sql:
+            # Not counted against repair_count: if it fails, both LLM repairs remain
+            return {
+                "sql_query": cached_sql,
+                "error": "",
+                "pending_repair": {**failure, "cached": True}
+            }
+
         try:
-            pred = self.sql_repairer(
+            # Later repair attempts move up the repair model chain
+            pred = self._predict(
+                "repair",
+                self.sql_repairer,
+                state["repair_count"],
                 original_query=state["sql_query"],
                 error_message=state["error"],
                 db_schema=self.schema
             )
             # Clean the fixed SQL
             fixed_sql = pred.fixed_query.replace("```sql", "").replace("```", "").strip()
+            if not fixed_sql or normalize_sql(fixed_sql) == normalize_sql(state["sql_query"]):
+                return {"repair_count": state["repair_count"] + 1}
             return {
                 "sql_query": fixed_sql,
                 "repair_count": state["repair_count"] + 1,
-                "error": ""  # Clear error after repair
+                "error": "",  # Clear error after repair
+                "pending_repair": failure
             }
         except Exception as e:
-            # If repair fails, just increment count and keep original query
+            # No new SQL: keep the error so route_after_repair skips re-executing it
             return {"repair_count": state["repair_count"] + 1}
 
+    def _traced_node(self, name, node):
+        """Wrap a graph node in a tracing span; LM usage is annotated by `_predict`."""
+        return self.tracer.wrap(name, node)
+
     def build_graph(self):
         workflow = StateGraph(AgentState)
         
-        workflow.add_node("router", self.router_node)
-        workflow.add_node("retriever", self.retriever_node)
-        workflow.add_node("planner", self.planner_node)
-        workflow.add_node("sql_generator", self.sql_generator_node)
-        workflow.add_node("executor", self.executor_node)
-        workflow.add_node("synthesizer", self.synthesizer_node)
-        workflow.add_node("repair", self.repair_node)
+        workflow.add_node("router", self._traced_node("router", self.router_node))
+        workflow.add_node("retriever", self._traced_node("retriever", self.retriever_node))
+        workflow.add_node("planner", self._traced_node("planner", self.planner_node))
+        workflow.add_node("sql_generator", self._traced_node("sql_generator", self.sql_generator_node))
+        workflow.add_node("executor", self._traced_node("executor", self.executor_node))
+        workflow.add_node("synthesizer", self._traced_node("synthesizer", self.synthesizer_node))
+        workflow.add_node("repair", self._traced_node("repair", self.repair_node))
         
         workflow.set_entry_point("router")
         
@@ -166,7 +338,22 @@ class HybridAgent:
             }
         )
         
-        workflow.add_edge("sql_generator", "executor")
+        def route_after_generator(state):
+            # The generator already executed its SQL; don't run it again
+            result = state.get("sql_result")
+            if result and state.get("sql_query"):
+                return "repair" if result.get("error") else "synthesizer"
+            return "executor"
+
+        workflow.add_conditional_edges(
+            "sql_generator",
+            route_after_generator,
+            {
+                "executor": "executor",
+                "repair": "repair",
+                "synthesizer": "synthesizer"
+            }
+        )
         
         def route_after_executor(state):
             if state["error"] and state["repair_count"] < 2:
@@ -182,7 +369,42 @@ class HybridAgent:
             }
         )
         
-        workflow.add_edge("repair", "sql_generator") # Assume repair fixes SQL
+        # Repaired SQL goes straight back to execution; regenerating would discard the fix.
+        # A repair that produced no new SQL keeps its error and goes to the synthesizer.
+        def route_after_repair(state):
+            if state["error"]:
+                return "synthesizer"
+            return "executor"
+
+        workflow.add_conditional_edges(
+            "repair",
+            route_after_repair,
+            {
+                "executor": "executor",
+                "synthesizer": "synthesizer"
+            }
+        )
         workflow.add_edge("synthesizer", END)
         
         return workflow.compile()
+
+    def run(self, question: str, format_hint: str) -> Dict[str, Any]:
+        """Answer one question; same result shape as SimpleAgent.run."""
+        if self._graph is None:
+            self._graph = self.build_graph()
+        state = self._graph.invoke({
+            "question": question,
+            "format_hint": format_hint,
+            "sql_query": "",
+            "sql_result": {},
+            "retrieved_docs": [],
+            "repair_count": 0,
+            "error": "",
+            "pending_repair": {}
+        })
+        return {
+            "final_answer": state.get("final_answer"),
+            "sql": state.get("sql_query", ""),
+            "citations": state.get("citations", []),
+            "explanation": state.get("explanation") or "Generated via HybridAgent"
+        }
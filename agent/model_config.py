@@ -0,0 +1,50 @@
+from typing import Dict, List, Optional
+
+# Per-stage model chains. The first model handles the stage; later models are
+# the fallback (primary unreachable / errors) and escalation (output failed
+# validation) path, tried in order.
+
+SIMPLE_PROFILES: Dict[str, Dict[str, List[str]]] = {
+    # Single model everywhere (previous behaviour)
+    "default": {
+        "generate_sql": ["llama3.2:3b"],
+        "synthesize": ["llama3.2:3b"],
+    },
+    # Tiny model formats answers; SQL starts on the 3B model and escalates to a 7B coder
+    "tiered": {
+        "generate_sql": ["llama3.2:3b", "qwen2.5-coder:7b"],
+        "synthesize": ["llama3.2:1b", "llama3.2:3b"],
+    },
+}
+
+HYBRID_PROFILES: Dict[str, Dict[str, List[str]]] = {
+    # Empty chains fall back to the globally configured dspy LM
+    "default": {},
+    "tiered": {
+        "router": ["ollama/llama3.2:1b", "ollama/phi3.5:3.8b-mini-instruct-q4_K_M"],
+        "planner": ["ollama/llama3.2:1b", "ollama/phi3.5:3.8b-mini-instruct-q4_K_M"],
+        "sql_generator": ["ollama/phi3.5:3.8b-mini-instruct-q4_K_M", "ollama/qwen2.5-coder:7b"],
+        "repair": ["ollama/phi3.5:3.8b-mini-instruct-q4_K_M", "ollama/qwen2.5-coder:7b"],
+        "synthesizer": ["ollama/llama3.2:1b", "ollama/phi3.5:3.8b-mini-instruct-q4_K_M"],
+    },
+}
+
+
+def parse_model_overrides(specs: Optional[List[str]]) -> Dict[str, List[str]]:
+    """Parse CLI overrides of the form `stage=model1,model2`."""
+    overrides = {}
+    for spec in specs or []:
+        stage, _, models = spec.partition("=")
+        if not stage or not models:
+            raise ValueError(f"Invalid model spec '{spec}', expected stage=model1,model2")
+        overrides[stage.strip()] = [m.strip() for m in models.split(",") if m.strip()]
+    return overrides
+
+
+def resolve_models(profiles: Dict[str, Dict[str, List[str]]], profile: str = "default",
+                   overrides: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
+    if profile not in profiles:
+        raise ValueError(f"Unknown model profile '{profile}', expected one of {sorted(profiles)}")
+    models = {stage: list(chain) for stage, chain in profiles[profile].items()}
+    models.update(overrides or {})
+    return models
@@ -1,44 +1,176 @@
+import argparse
+import json
+import threading
 import dspy
-from dspy.teleprompt import BootstrapFewShot
-from agent.dspy_signatures import Router
-from agent.graph_hybrid import HybridAgent
+from dspy.teleprompt import BootstrapFewShot, BootstrapFewShotWithRandomSearch
+from agent.dspy_signatures import Router, GenerateSQL, SynthesizeAnswer
+from agent.tools.sqlite_tool import SQLiteTool
+from agent.compiled_store import CompiledProgramStore, program_key, strip_demo_fields
+from agent.repair_cache import normalize_sql
+from agent.trainsets import TRAINSETS, OPTIMIZER_CONFIGS, DEMO_EXCLUDED_FIELDS
+
+SIGNATURES = {
+    "router": Router,
+    "sql_generator": GenerateSQL,
+    "synthesizer": SynthesizeAnswer,
+}
+
+INPUT_FIELDS = {
+    "router": ("question",),
+    "sql_generator": ("question", "db_schema"),
+    "synthesizer": ("question", "format_hint", "sql_query", "sql_result", "retrieved_docs"),
+}
+
+sqlite_tool = SQLiteTool()
+
+
+def cached_metric(key_fn):
+    """Memoize a metric on key_fn(example, pred).
+
+    Random-search optimizers score the same (example, prediction) pairs many
+    times across candidate programs; for SQL every score is a DB round trip.
+    """
+    def decorator(metric):
+        cache = {}
+        lock = threading.Lock()
+
+        def wrapper(example, pred, trace=None):
+            key = key_fn(example, pred)
+            with lock:
+                if key in cache:
+                    return cache[key]
+            score = metric(example, pred, trace)
+            with lock:
+                cache[key] = score
+            return score
+        wrapper.__name__ = metric.__name__
+        return wrapper
+    return decorator
+
+
+def _result_signature(result):
+    """Order-insensitive, rounding-tolerant fingerprint of a query result."""
+    rows = []
+    for row in result["rows"]:
+        rows.append(tuple(round(v, 2) if isinstance(v, float) else v for v in row.values()))
+    return sorted(rows, key=repr)
+
+
+def _answers_match(expected, actual):
+    if isinstance(actual, str):
+        try:
+            actual = json.loads(actual)
+        except Exception:
+            pass
+    if isinstance(expected, bool) or expected is None:
+        return expected == actual
+    if isinstance(expected, (int, float)):
+        try:
+            return abs(float(actual) - expected) <= max(0.01, abs(expected) * 1e-4)
+        except (TypeError, ValueError):
+            return False
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and set(expected) == set(actual) and all(
+            _answers_match(v, actual[k]) for k, v in expected.items())
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and all(
+            _answers_match(e, a) for e, a in zip(expected, actual))
+    return str(expected).strip().lower() == str(actual).strip().lower()
+
+
+@cached_metric(lambda example, pred: (example.question, str(pred.tool).strip().lower()))
+def router_metric(example, pred, trace=None):
+    return example.tool.lower() == str(pred.tool).strip().lower()
+
+
+@cached_metric(lambda example, pred: (example.question, normalize_sql(str(pred.sql_query))))
+def sql_metric(example, pred, trace=None):
+    sql = str(pred.sql_query).replace("```sql", "").replace("```", "").strip()
+    predicted = sqlite_tool.execute_query(sql)
+    if predicted["error"]:
+        return False
+    expected = sqlite_tool.execute_query(example.sql_query)
+    return _result_signature(predicted) == _result_signature(expected)
+
+
+@cached_metric(lambda example, pred: (example.question, example.sql_result, str(pred.final_answer)))
+def synthesizer_metric(example, pred, trace=None):
+    return _answers_match(example.final_answer, pred.final_answer)
+
+
+METRICS = {
+    "router": router_metric,
+    "sql_generator": sql_metric,
+    "synthesizer": synthesizer_metric,
+}
+
+
+def build_examples(name):
+    schema = sqlite_tool.get_schema() if name == "sql_generator" else None
+    examples = []
+    for item in TRAINSETS[name]:
+        fields = dict(item)
+        if schema is not None:
+            fields["db_schema"] = schema
+        examples.append(dspy.Example(**fields).with_inputs(*INPUT_FIELDS[name]))
+    return examples
+
+
+def compile_program(name, model=None, num_threads=8, force=False, store=None):
+    """Compile one module, reusing a saved program with the same signature/trainset/config/model."""
+    store = store or CompiledProgramStore()
+    model = model or getattr(dspy.settings.lm, "model", "")
+    signature, config = SIGNATURES[name], OPTIMIZER_CONFIGS[name]
+    key = program_key(signature, TRAINSETS[name], config, model)
+
+    program = dspy.ChainOfThought(signature)
+    if not force and store.load(name, key, program):
+        print(f"{name}: using compiled program {store.path(name, key)}")
+        return program
+
+    examples = build_examples(name)
+    metric = METRICS[name]
+    options = {k: v for k, v in config.items() if k != "optimizer"}
+    if config["optimizer"] == "BootstrapFewShotWithRandomSearch":
+        # Candidate programs are scored with a threaded Evaluate under the hood
+        teleprompter = BootstrapFewShotWithRandomSearch(metric=metric, num_threads=num_threads, **options)
+    else:
+        teleprompter = BootstrapFewShot(metric=metric, **options)
+
+    print(f"Compiling {name}...")
+    compiled = teleprompter.compile(program, trainset=examples)
+    # Score and save the program exactly as it will run: without per-demo copies of shared inputs
+    strip_demo_fields(compiled, DEMO_EXCLUDED_FIELDS.get(name, ()))
+
+    evaluate = dspy.Evaluate(devset=examples, metric=metric, num_threads=num_threads, display_progress=False)
+    score = evaluate(compiled)
+    score = float(getattr(score, "score", score))
+
+    path = store.save(name, key, compiled, metadata={"program": name, "key": key, "model": model,
+                                                      "optimizer": config, "train_score": score})
+    print(f"{name}: train score {score:.1f}, saved to {path}")
+    return compiled
+
 
 def optimize_router():
-    # Define a small training set for the router
-    train_examples = [
-        dspy.Example(question="What is the return policy for unopened beverages?", tool="rag").with_inputs("question"),
-        dspy.Example(question="How many orders were placed in 1997?", tool="sql").with_inputs("question"),
-        dspy.Example(question="What was the total revenue for Beverages in Summer 1997?", tool="hybrid").with_inputs("question"),
-        dspy.Example(question="List the top 5 products by unit price.", tool="sql").with_inputs("question"),
-        dspy.Example(question="Who is the contact person for Alfreds Futterkiste?", tool="sql").with_inputs("question"),
-        dspy.Example(question="What are the KPI definitions for Gross Margin?", tool="rag").with_inputs("question"),
-        dspy.Example(question="Calculate the average order value for Winter Classics 1997.", tool="hybrid").with_inputs("question"),
-        dspy.Example(question="Show me the marketing calendar for 1997.", tool="rag").with_inputs("question"),
-        dspy.Example(question="Which supplier provides Exotic Liquids?", tool="sql").with_inputs("question"),
-        dspy.Example(question="What is the return window for produce?", tool="rag").with_inputs("question"),
-    ]
-
-    # Define a metric for the router
-    def router_metric(example, pred, trace=None):
-        return example.tool.lower() == pred.tool.lower()
-
-    # Configure the optimizer
-    config = dict(max_bootstrapped_demos=3, max_labeled_demos=3)
-    teleprompter = BootstrapFewShot(metric=router_metric, **config)
-
-    # Compile the router
-    print("Compiling Router...")
-    compiled_router = teleprompter.compile(dspy.ChainOfThought(Router), trainset=train_examples)
-    
-    print("Optimization complete.")
-    return compiled_router
+    return compile_program("router")
+
 
 if __name__ == "__main__":
+    from agent.factory import DEFAULT_DSPY_MODEL
+
+    parser = argparse.ArgumentParser(description="Compile and persist optimized DSPy modules")
+    parser.add_argument("--programs", nargs="+", choices=sorted(SIGNATURES), default=sorted(SIGNATURES))
+    parser.add_argument("--model", default=DEFAULT_DSPY_MODEL, help="LM the programs are compiled for")
+    parser.add_argument("--api-base", default="http://localhost:11434")
+    parser.add_argument("--threads", type=int, default=8, help="Parallel metric evaluations")
+    parser.add_argument("--force", action="store_true", help="Recompile even if a matching program is saved")
+    args = parser.parse_args()
+
     # Configure DSPy (needs to match main config)
-    lm = dspy.LM(model='ollama/phi3.5:3.8b-mini-instruct-q4_K_M', api_base='http://localhost:11434')
+    lm = dspy.LM(model=args.model, api_base=args.api_base)
     dspy.settings.configure(lm=lm)
-    
-    optimized_router = optimize_router()
-    
-    # Save the optimized module (optional, or just print success)
-    print("Router optimized successfully.")
+
+    for name in args.programs:
+        compile_program(name, model=args.model, num_threads=args.threads, force=args.force)
+    print("Optimization complete.")
@@ -0,0 +1,165 @@
+import csv
+import io
+from typing import List, Dict, Any, Optional
+
+# ~4 characters per token for llama/phi tokenizers on English + SQL text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def format_table(columns: List[str], rows: List[Dict[str, Any]]) -> str:
+    """Serialize rows as a CSV table (header first), far denser than indented JSON."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_format_value(row.get(col)) for col in columns])
+    return buffer.getvalue().rstrip("\n")
+
+
+def summarize_rows(columns: List[str], rows: List[Dict[str, Any]]) -> str:
+    """Aggregates over all rows for numeric columns (sum/min/max/avg)."""
+    lines = []
+    for col in columns:
+        values = [row[col] for row in rows if isinstance(row.get(col), (int, float)) and not isinstance(row.get(col), bool)]
+        if values:
+            lines.append(
+                f"{col}: sum={_format_value(float(sum(values)))}, min={_format_value(min(values))}, "
+                f"max={_format_value(max(values))}, avg={_format_value(sum(values) / len(values))}"
+            )
+    return "\n".join(lines)
+
+
+def _truncate(text: str, budget_tokens: int) -> str:
+    """Hard cap: cut `text` so estimate_tokens(text) <= budget_tokens."""
+    limit = max(0, budget_tokens) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(0, limit - 3)].rstrip() + "..." if limit >= 3 else ""
+
+
+def _leading_columns(columns: List[str], budget_tokens: int) -> List[str]:
+    """Longest prefix of `columns` whose CSV header fits `budget_tokens`."""
+    kept: List[str] = []
+    for col in columns:
+        if estimate_tokens(format_table(kept + [col], [])) > budget_tokens:
+            break
+        kept.append(col)
+    return kept
+
+
+def fit_sql_result(result: Dict[str, Any], budget_tokens: int) -> str:
+    """Render a SQLiteTool result within `budget_tokens`.
+
+    Rows are kept in query order (so ORDER BY ... LIMIT semantics survive); when
+    the table does not fit, the top-N rows that do are kept and followed by a
+    note plus aggregates computed over every row. The header is limited to half
+    the budget and the aggregates to a third, dropping columns/lines that do not
+    fit, so the returned text never exceeds `budget_tokens`.
+    """
+    if not result:
+        return _truncate("No SQL result.", budget_tokens)
+    if result.get("error"):
+        return _truncate(f"SQL Error: {result['error']}", budget_tokens)
+    rows = result.get("rows") or []
+    columns = result.get("columns") or (list(rows[0].keys()) if rows else [])
+    if not rows:
+        return _truncate(format_table(columns, []) + "\n(0 rows)", budget_tokens)
+
+    table = format_table(columns, rows)
+    if estimate_tokens(table) <= budget_tokens:
+        return table
+
+    shown = _leading_columns(columns, budget_tokens // 2)
+    notes = []
+    if len(shown) < len(columns):
+        notes.append(f"... {len(columns) - len(shown)} more columns omitted ({len(shown)} of {len(columns)} shown)")
+
+    summary = ""
+    summary_lines = summarize_rows(shown, rows).splitlines()
+    for count in range(len(summary_lines), 0, -1):
+        candidate = f"Aggregates over all {len(rows)} rows:\n" + "\n".join(summary_lines[:count])
+        if estimate_tokens(candidate) <= budget_tokens // 3:
+            summary = candidate
+            break
+
+    # Room for the omitted-rows note, which is written once the row count is known
+    reserved = sum(estimate_tokens(n) + 1 for n in notes) + estimate_tokens(summary) + 24
+    remaining = budget_tokens - reserved
+    # Largest prefix of rows that still fits next to the notes and summary
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(format_table(shown, rows[:mid])) <= remaining:
+            lo = mid
+        else:
+            hi = mid - 1
+    parts = [format_table(shown, rows[:lo]) if shown else ""]
+    parts += notes
+    parts.append(f"... {len(rows) - lo} more rows omitted (top {lo} of {len(rows)} shown)")
+    if summary:
+        parts.append(summary)
+    return _truncate("\n".join(p for p in parts if p), budget_tokens)
+
+
+def fit_docs(docs: List[Dict[str, Any]], budget_tokens: int) -> str:
+    """Render retrieved chunks best-score first, trimming the last one to the budget."""
+    parts = []
+    remaining = budget_tokens
+    for doc in sorted(docs or [], key=lambda d: d.get("score", 0.0), reverse=True):
+        header = f"[{doc.get('id', doc.get('source', 'doc'))}]"
+        content = doc.get("content", "")
+        cost = estimate_tokens(header) + estimate_tokens(content) + 1
+        if cost > remaining:
+            room = (remaining - estimate_tokens(header) - 2) * CHARS_PER_TOKEN
+            if room >= 80:
+                parts.append(f"{header}\n{content[:room].rstrip()}...")
+            break
+        parts.append(f"{header}\n{content}")
+        remaining -= cost
+    return "\n\n".join(parts) if parts else "No documents."
+
+
+class PromptBudget:
+    """Token budget for one prompt: context window minus output and fixed-text reserve."""
+
+    def __init__(self, num_ctx: int = 4096, reserve_tokens: int = 512):
+        self.num_ctx = num_ctx
+        self.reserve_tokens = reserve_tokens
+
+    def available(self, *fixed_parts: str) -> int:
+        """Tokens left for variable sections after the fixed prompt text."""
+        used = sum(estimate_tokens(part) for part in fixed_parts)
+        return max(0, self.num_ctx - self.reserve_tokens - used)
+
+    def split(self, total: int, weights: Dict[str, float], needs: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """Divide `total` by weight; sections needing less than their share donate the rest."""
+        needs = needs or {}
+        shares = {}
+        pending = dict(weights)
+        left = total
+        # Hand out small sections first so their slack flows to the bigger ones
+        while pending:
+            weight_sum = sum(pending.values()) or 1.0
+            settled = {name for name, w in pending.items()
+                       if name in needs and needs[name] <= left * w / weight_sum}
+            if not settled:
+                for name, w in pending.items():
+                    shares[name] = int(left * w / weight_sum)
+                break
+            for name in settled:
+                shares[name] = needs[name]
+                left -= needs[name]
+                del pending[name]
+        return shares
@@ -1,31 +1,40 @@
 import os
+import re
 import glob
-from typing import List, Dict, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import json
+import hashlib
+from typing import List, Dict, Any, Optional
 import numpy as np
 
+# Same tokenization as sklearn's TfidfVectorizer default, so a persisted index
+# can score queries without importing scikit-learn
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
 class Retrieval:
-    def __init__(self, docs_dir: str = "docs"):
+    def __init__(self, docs_dir: str = "docs", index_path: Optional[str] = ".cache/retrieval_index.npz"):
         self.docs_dir = docs_dir
+        self.index_path = index_path
         self.chunks: List[Dict[str, Any]] = []
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = None
         self.tfidf_matrix = None
         self._load_and_chunk_docs()
-        self._build_index()
+        if not self._load_index():
+            self._build_index()
+            self._save_index()
 
     def _load_and_chunk_docs(self):
         """Loads documents and chunks them by paragraph."""
-        md_files = glob.glob(os.path.join(self.docs_dir, "*.md"))
-        
+        md_files = sorted(glob.glob(os.path.join(self.docs_dir, "*.md")))
+
         for file_path in md_files:
             filename = os.path.basename(file_path).replace(".md", "")
             with open(file_path, "r", encoding="utf-8") as f:
                 content = f.read()
-            
+
             # Simple paragraph splitting by double newline
             paragraphs = content.split("\n\n")
-            
+
             for i, para in enumerate(paragraphs):
                 if para.strip():
                     chunk_id = f"{filename}::chunk{i}"
@@ -35,30 +44,86 @@ class Retrieval:
                         "source": filename
                     })
 
+    def _corpus_hash(self) -> str:
+        payload = json.dumps([[c["id"], c["content"]] for c in self.chunks])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     def _build_index(self):
         """Builds TF-IDF index."""
         if not self.chunks:
             return
-        
+
+        # Only needed when there is no up-to-date persisted index
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
         corpus = [chunk["content"] for chunk in self.chunks]
-        self.tfidf_matrix = self.vectorizer.fit_transform(corpus)
+        vectorizer = TfidfVectorizer(stop_words='english')
+        self.tfidf_matrix = vectorizer.fit_transform(corpus).toarray().astype(np.float32)
+        self.vocabulary = {term: int(idx) for term, idx in vectorizer.vocabulary_.items()}
+        self.idf = vectorizer.idf_.astype(np.float32)
+
+    def _load_index(self) -> bool:
+        """Loads a persisted index if it was built from the current docs."""
+        if not self.index_path or not os.path.exists(self.index_path):
+            return False
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                if str(data["corpus_hash"]) != self._corpus_hash():
+                    return False
+                terms = data["terms"]
+                self.vocabulary = {str(term): i for i, term in enumerate(terms)}
+                self.idf = data["idf"]
+                self.tfidf_matrix = data["matrix"]
+            return True
+        except Exception as e:
+            print(f"Retrieval index load error: {e}")
+            return False
+
+    def _save_index(self):
+        if not self.index_path or self.tfidf_matrix is None:
+            return
+        try:
+            directory = os.path.dirname(self.index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            terms = sorted(self.vocabulary, key=self.vocabulary.get)
+            np.savez(
+                self.index_path,
+                corpus_hash=np.array(self._corpus_hash()),
+                terms=np.array(terms),
+                idf=self.idf,
+                matrix=self.tfidf_matrix
+            )
+        except Exception as e:
+            print(f"Retrieval index save error: {e}")
+
+    def _vectorize(self, query: str):
+        """TF-IDF vector for the query, L2-normalized like TfidfVectorizer.transform."""
+        vec = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(query.lower()):
+            idx = self.vocabulary.get(token)
+            if idx is not None:
+                vec[idx] += 1.0
+        vec *= self.idf
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
 
     def retrieve(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Retrieves top-k relevant chunks."""
         if not self.chunks or self.tfidf_matrix is None:
             return []
 
-        query_vec = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-        
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        similarities = self.tfidf_matrix @ self._vectorize(query)
+
         # Get top-k indices
         top_indices = similarities.argsort()[-top_k:][::-1]
-        
+
         results = []
         for idx in top_indices:
             if similarities[idx] > 0: # Only return relevant results
                 result = self.chunks[idx].copy()
                 result["score"] = float(similarities[idx])
                 results.append(result)
-        
+
         return results
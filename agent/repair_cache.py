@@ -0,0 +1,168 @@
+import difflib
+import json
+import os
+import re
+import threading
+from typing import Dict, Any, Optional
+
+# Errors whose fix is usually a single identifier swap (e.g. OrderDate -> o.OrderDate)
+IDENTIFIER_ERROR = re.compile(r"no such (column|table|function): (\S+)", re.IGNORECASE)
+TOKEN = re.compile(r"\"[^\"]*\"|'[^']*'|\w+(?:\.\w+)?|\S")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace, case and trailing semicolons so equivalent queries share a key."""
+    sql = re.sub(r"\s+", " ", sql or "").strip().rstrip(";").strip()
+    return sql.lower()
+
+
+def error_signature(error: str) -> str:
+    """Reduce a SQLite error to a stable signature (numbers and literals masked)."""
+    error = (error or "").strip()
+    match = IDENTIFIER_ERROR.search(error)
+    if match:
+        return f"no such {match.group(1).lower()}: {match.group(2)}"
+    error = re.sub(r"'[^']*'|\"[^\"]*\"", "?", error)
+    error = re.sub(r"\d+", "N", error)
+    return error.lower()
+
+
+def _qualifiers_available(replacement: str, sql: str) -> bool:
+    """True if every `alias.` / `table.` qualifier in `replacement` is a table or alias in `sql`.
+
+    A rule learned as OrderDate -> o.OrderDate only fits queries that alias a table as `o`.
+    """
+    for qualifier in re.findall(r"(\"[^\"]+\"|\w+)\.", replacement):
+        name = re.escape(qualifier.strip('"'))
+        as_table = rf'\b(?:from|join)\s+"?{name}"?(?![\w"])'
+        as_alias = rf'\b(?:from|join)\s+(?:"[^"]*"|\w+)\s+(?:as\s+)?{name}\b'
+        if not re.search(as_table, sql, re.IGNORECASE) and not re.search(as_alias, sql, re.IGNORECASE):
+            return False
+    return True
+
+
+class RepairCache:
+    """Persistent map from failing SQL / error signature to a known-good fix.
+
+    Two levels are kept:
+    - by_sql: normalized failing query -> fixed query (exact replay)
+    - by_error: identifier-error signature -> token substitution learned from a
+      previous successful repair, applied to any query hitting the same error
+    """
+
+    def __init__(self, cache_path: str = "data/repair_cache.json"):
+        self.cache_path = cache_path
+        self.by_sql: Dict[str, str] = {}
+        self.by_error: Dict[str, Dict[str, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.by_sql = data.get("by_sql", {})
+            self.by_error = data.get("by_error", {})
+        except Exception as e:
+            print(f"Repair cache load error: {e}")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"by_sql": self.by_sql, "by_error": self.by_error}, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def lookup(self, sql: str, error: str) -> Optional[str]:
+        """Return a cached fix for this failure, or None if an LLM repair is needed."""
+        with self._lock:
+            fixed = self.by_sql.get(normalize_sql(sql))
+            if fixed is None:
+                rule = self.by_error.get(error_signature(error))
+                if rule and _qualifiers_available(rule["replace"], sql):
+                    pattern = r"(?<![\w.])" + re.escape(rule["find"]) + r"(?![\w])"
+                    candidate = re.sub(pattern, rule["replace"], sql)
+                    if candidate != sql:
+                        fixed = candidate
+            if fixed is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return fixed
+
+    def confirm(self):
+        """A fix returned by lookup() executed cleanly: one RepairSQL call was saved."""
+        with self._lock:
+            self.saved += 1
+
+    def evict(self, failing_sql: str, error: str):
+        """A fix returned by lookup() still failed; drop the entries that produced it."""
+        with self._lock:
+            removed = self.by_sql.pop(normalize_sql(failing_sql), None) is not None
+            removed = self.by_error.pop(error_signature(error), None) is not None or removed
+            if not removed:
+                return
+            self.evictions += 1
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Repair cache save error: {e}")
+
+    def store(self, failing_sql: str, error: str, fixed_sql: str):
+        """Record a repair that was verified to execute without error."""
+        if not failing_sql or not fixed_sql or normalize_sql(failing_sql) == normalize_sql(fixed_sql):
+            return
+        with self._lock:
+            self.by_sql[normalize_sql(failing_sql)] = fixed_sql
+            rule = self._learn_substitution(failing_sql, error, fixed_sql)
+            if rule:
+                self.by_error[error_signature(error)] = rule
+            self.stores += 1
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Repair cache save error: {e}")
+
+    def _learn_substitution(self, failing_sql: str, error: str, fixed_sql: str) -> Optional[Dict[str, str]]:
+        """If the fix replaced the offending identifier in a single spot, keep that swap."""
+        match = IDENTIFIER_ERROR.search(error or "")
+        if not match:
+            return None
+        bad = match.group(2).strip("'\"")
+        before, after = TOKEN.findall(failing_sql), TOKEN.findall(fixed_sql)
+        changes = [op for op in difflib.SequenceMatcher(a=before, b=after, autojunk=False).get_opcodes() if op[0] != "equal"]
+        replacements = set()
+        for tag, i1, i2, j1, j2 in changes:
+            old, new = " ".join(before[i1:i2]), " ".join(after[j1:j2])
+            if tag != "replace" or bad not in old:
+                return None
+            replacements.add((old, new))
+        if len(replacements) != 1:
+            return None
+        old, new = replacements.pop()
+        return {"find": old, "replace": new}
+
+    def stats(self) -> Dict[str, Any]:
+        """llm_calls_saved counts hits whose fix then executed cleanly."""
+        lookups = self.hits + self.misses
+        return {
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "llm_calls_saved": self.saved,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self.by_sql),
+            "error_rules": len(self.by_error),
+        }
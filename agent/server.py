@@ -0,0 +1,225 @@
+"""Persistent agent service: keeps one initialized agent warm behind a small HTTP API.
+
+    python -m agent.server --agent simple --port 8765
+    python -m agent.server --agent hybrid --unix-socket /tmp/copilot.sock
+
+Endpoints:
+    POST /ask      {"question": ..., "format_hint": ..., "id"?: ...} -> agent result
+    GET  /health   liveness and readiness
+    GET  /metrics  request counters, latency percentiles and per-stage trace summary
+"""
+import argparse
+import asyncio
+import collections
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from agent.factory import AGENT_KINDS, create_agent
+from agent.tracing import Tracer, percentile
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class AgentServer:
+    """Async HTTP front end over a bounded worker pool running a shared agent.
+
+    Requests beyond `workers` running plus `max_queue` waiting are rejected
+    with 503 instead of piling up behind a slow model.
+    """
+
+    def __init__(self, agent, tracer: Tracer, agent_name: str, workers: int = 4, max_queue: int = 32):
+        self.agent = agent
+        self.tracer = tracer
+        self.agent_name = agent_name
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent")
+        self.started_at = time.time()
+        self.pending = 0
+        self.counters = collections.Counter()
+        self.latencies_ms = collections.deque(maxlen=2000)
+        self._lock = threading.Lock()
+
+    # --- request handling -------------------------------------------------
+
+    def _answer(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with self.tracer.span("question", trace=payload.get("id")):
+            result = self.agent.run(payload["question"], payload.get("format_hint", ""))
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.latencies_ms.append(elapsed)
+        result = dict(result)
+        if payload.get("id") is not None:
+            result["id"] = payload["id"]
+        result["latency_ms"] = round(elapsed, 1)
+        return result
+
+    async def ask(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(payload, dict) or not payload.get("question"):
+            return 400, {"error": "Body must be a JSON object with a 'question' field"}
+
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            return 503, {"error": "Server busy, retry later"}
+
+        self.pending += 1
+        self.counters["requests"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, self._answer, payload)
+            return 200, result
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Error answering {payload.get('id')}: {e}")
+            return 500, {"error": str(e)}
+        finally:
+            self.pending -= 1
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "agent": self.agent_name,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "pending": self.pending,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self.latencies_ms)
+        metrics = {
+            **self.health(),
+            "requests": self.counters["requests"],
+            "errors": self.counters["errors"],
+            "rejected": self.counters["rejected"],
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 1),
+                "p95": round(percentile(latencies, 95), 1),
+                "max": round(max(latencies), 1) if latencies else 0.0,
+            },
+            "stages": self.tracer.summary(by="model"),
+        }
+        repair_cache = getattr(self.agent, "repair_cache", None)
+        if repair_cache is not None:
+            metrics["repair_cache"] = repair_cache.stats()
+        return metrics
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        path = path.split("?", 1)[0]
+        if path == "/ask":
+            if method != "POST":
+                return 405, {"error": "Use POST"}
+            return await self.ask(body)
+        if method != "GET":
+            return 405, {"error": "Use GET"}
+        if path == "/health":
+            return 200, self.health()
+        if path == "/metrics":
+            return 200, self.metrics()
+        return 404, {"error": "Not found"}
+
+    # --- minimal HTTP/1.1 framing -----------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path, headers, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    await self._write(writer, 400, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   500: "Internal Server Error", 503: "Service Unavailable"}
+        data = json.dumps(payload, default=str).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_socket: Optional[str] = None):
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+            where = f"unix:{unix_socket}"
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"{self.agent_name} agent ready on {where} ({self.workers} workers)")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a warm Retail Analytics Copilot agent")
+    parser.add_argument("--agent", choices=AGENT_KINDS, default="simple")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent agent runs")
+    parser.add_argument("--max-queue", type=int, default=32, help="Requests allowed to wait for a worker")
+    parser.add_argument("--sql-candidates", type=int, default=1)
+    parser.add_argument("--kpi-engine", action="store_true", help="Answer recognised KPI questions from the columnar KPI cache")
+    parser.add_argument("--model-profile", default="default", help="Per-stage model profile: default or tiered")
+    parser.add_argument("--api-base", default="http://localhost:11434", help="Ollama base URL")
+    args = parser.parse_args()
+
+    tracer = Tracer(max_spans=20000)
+    start = time.perf_counter()
+    agent = create_agent(args.agent, tracer, args.model_profile, api_base=args.api_base,
+                         sql_candidates=args.sql_candidates, kpi_engine=args.kpi_engine)
+    print(f"Agent initialized in {time.perf_counter() - start:.2f}s")
+
+    server = AgentServer(agent, tracer, args.agent, workers=args.workers, max_queue=args.max_queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,135 @@
 import json
 import requests
 from agent.tools.sqlite_tool import SQLiteTool
+from agent.tools.kpi_engine import KPIEngine
 from agent.rag.retrieval import Retrieval
+from agent.speculative import first_valid_sql, candidate_temperature
+from agent.tracing import NULL_TRACER
+from agent.prompt_budget import PromptBudget, fit_sql_result, fit_docs
+from agent.model_config import SIMPLE_PROFILES
+
+# Prompts are split into a byte-identical static prefix and a short dynamic
+# suffix. Ollama reuses the KV cache for the longest matching prompt prefix, so
+# keeping everything that never changes (instructions, schema, few-shot) first
+# means only the question has to be prefilled on each call.
+SQL_PREFIX = """You are a SQLite expert. Generate a query based on examples.
+
+Schema:
+{schema}
+
+Examples:
+Q: "What is the total revenue in 1997?"
+A: {{"sql": "SELECT SUM(UnitPrice * Quantity) FROM OrderDetails od JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y', o.OrderDate) = '1997'"}}
+
+Q: "Which category sold the most in June 1997?"
+A: {{"sql": "SELECT c.CategoryName, SUM(od.Quantity) as Total FROM Categories c JOIN Products p ON c.CategoryID = p.CategoryID JOIN OrderDetails od ON p.ProductID = od.ProductID JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y-%m', o.OrderDate) = '1997-06' GROUP BY c.CategoryName ORDER BY Total DESC LIMIT 1"}}
+
+Q: "Top 3 products by revenue?"
+A: {{"sql": "SELECT p.ProductName, SUM(od.UnitPrice * od.Quantity * (1 - COALESCE(od.Discount, 0))) as Revenue FROM Products p JOIN OrderDetails od ON p.ProductID = od.ProductID GROUP BY p.ProductID, p.ProductName ORDER BY Revenue DESC LIMIT 3"}}
+
+Return JSON: {{"sql": "..."}}
+"""
+
+SQL_SUFFIX = """
+Now generate for: "{question}"
+"""
+
+SYNTHESIZE_SQL_PREFIX = """Extract the answer from SQL results.
+Return JSON: {"final_answer": <value>, "citations": ["table_name"]}
+"""
+
+SYNTHESIZE_DOCS_PREFIX = """Answer from documents.
+Extract the answer from document content. Return JSON: {"final_answer": <value>, "citations": [<doc_ids>]}
+"""
+
+SYNTHESIZE_SUFFIX = """
+Question: {question}
+Format: {format_hint}
+{label}
+{data}
+"""
 
 class SimpleAgent:
-    def __init__(self):
+    def __init__(self, sql_candidates=1, tracer=None, models=None, kpi_engine=False):
         self.sqlite_tool = SQLiteTool()
         self.retrieval = Retrieval()
         self.schema = self.sqlite_tool.get_schema()
         self.api_url = "http://localhost:11434/api/generate"
         self.model = "llama3.2:3b"  # Recommended: 2x better than phi3.5
+        # Per-stage model chains: primary first, then fallback/escalation models
+        self.models = models or SIMPLE_PROFILES["default"]
+        self.num_ctx = 4096
+        # Leave room for the JSON answer the model has to generate
+        self.budget = PromptBudget(num_ctx=self.num_ctx, reserve_tokens=512)
+        # >1 samples SQL candidates concurrently and keeps the first usable one
+        self.sql_candidates = sql_candidates
+        self.tracer = tracer or NULL_TRACER
+        # Answers recognised KPI questions from a columnar cache instead of LLM-written SQL
+        self.kpi_engine = KPIEngine() if kpi_engine else None
+        # Keep the model (and its prompt cache) resident between calls and batches
+        self.keep_alive = "30m"
+        self.sql_prefix = SQL_PREFIX.format(schema=self.schema)
+
+    def _stream_llm(self, payload, stop):
+        """Stream a generation, closing the connection (Ollama aborts the request) once `stop` is set."""
+        pieces = []
+        with requests.post(self.api_url, json=payload, stream=True) as response:
+            for line in response.iter_lines():
+                if stop.is_set():
+                    self.tracer.annotate(cancelled=1)
+                    return None
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    return data
+                pieces.append(data.get("response", ""))
+                if data.get("done"):
+                    data["response"] = "".join(pieces)
+                    return data
+        return {"response": "".join(pieces)}
 
-    def _call_llm(self, prompt, format="json"):
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            "format": format,
-            "options": {
-                "temperature": 0.1, # Low temperature for deterministic output
-                "num_ctx": 4096
+    def _call_llm(self, prompt, format="json", temperature=0.1, models=None, stop=None):
+        """Call Ollama, falling back along `models` when a model errors or is unavailable.
+
+        With a `stop` event the response is streamed so a speculative candidate
+        that lost can be cancelled mid-generation; the call then returns None.
+        """
+        for model in models or [self.model]:
+            payload = {
+                "model": model,
+                "prompt": prompt,
+                "stream": stop is not None,
+                "format": format,
+                "keep_alive": self.keep_alive,
+                "options": {
+                    "temperature": temperature, # Low by default for deterministic output
+                    "num_ctx": self.num_ctx
+                }
             }
-        }
-        try:
-            response = requests.post(self.api_url, json=payload)
-            return response.json()['response']
-        except Exception as e:
-            print(f"LLM Call Error: {e}")
-            return "{}"
+            try:
+                if stop is not None:
+                    data = self._stream_llm(payload, stop)
+                    if data is None:
+                        return None
+                else:
+                    data = requests.post(self.api_url, json=payload).json()
+                if "error" in data:
+                    raise RuntimeError(data["error"])
+                # Ollama reports token counts and durations (ns) alongside the response
+                self.tracer.annotate(
+                    llm_calls=1,
+                    model=model,
+                    prompt_tokens=data.get("prompt_eval_count", 0),
+                    response_tokens=data.get("eval_count", 0),
+                    prefill_ms=data.get("prompt_eval_duration", 0) / 1e6,
+                    decode_ms=data.get("eval_duration", 0) / 1e6
+                )
+                return data['response']
+            except Exception as e:
+                print(f"LLM Call Error ({model}): {e}")
+                self.tracer.annotate(llm_errors=1)
+        return "{}"
 
     def _clean_sql(self, sql):
         # Remove markdown code blocks
@@ -82,27 +184,16 @@ class SimpleAgent:
                     pass
             return {}
 
-    def generate_sql(self, question):
-        prompt = f"""You are a SQLite expert. Generate a query based on examples.
-        
-        Schema:
-        {self.schema}
-        
-        Examples:
-        Q: "What is the total revenue in 1997?"
-        A: {{"sql": "SELECT SUM(UnitPrice * Quantity) FROM OrderDetails od JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y', o.OrderDate) = '1997'"}}
-        
-        Q: "Which category sold the most in June 1997?"
-        A: {{"sql": "SELECT c.CategoryName, SUM(od.Quantity) as Total FROM Categories c JOIN Products p ON c.CategoryID = p.CategoryID JOIN OrderDetails od ON p.ProductID = od.ProductID JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y-%m', o.OrderDate) = '1997-06' GROUP BY c.CategoryName ORDER BY Total DESC LIMIT 1"}}
-        
-        Q: "Top 3 products by revenue?"
-        A: {{"sql": "SELECT p.ProductName, SUM(od.UnitPrice * od.Quantity * (1 - COALESCE(od.Discount, 0))) as Revenue FROM Products p JOIN OrderDetails od ON p.ProductID = od.ProductID GROUP BY p.ProductID, p.ProductName ORDER BY Revenue DESC LIMIT 3"}}
-        
-        Now generate for: "{question}"
-        Return JSON: {{"sql": "..."}}
-        """
+    def sql_prompt(self, question):
+        return self.sql_prefix + SQL_SUFFIX.format(question=question)
+
+    def generate_sql(self, question, temperature=0.1, model=None, stop=None):
+        prompt = self.sql_prompt(question)
         
-        response = self._call_llm(prompt)
+        response = self._call_llm(prompt, temperature=temperature, models=[model] if model else self.models.get("generate_sql"),
+                                  stop=stop)
+        if response is None:
+            return ""  # Cancelled: another candidate already won
         data = self._parse_json(response)
         sql = data.get("sql", "")
         sql = self._clean_sql(sql)
@@ -114,46 +205,80 @@ class SimpleAgent:
             
         return sql
 
+    def synthesize_layout(self, has_sql_data):
+        """(static prefix, dynamic suffix template, data label) for the answer prompt."""
+        if has_sql_data:
+            return SYNTHESIZE_SQL_PREFIX, SYNTHESIZE_SUFFIX, "SQL Results (CSV, header first):"
+        return SYNTHESIZE_DOCS_PREFIX, SYNTHESIZE_SUFFIX, "Documents:"
+
     def synthesize(self, question, sql_result, docs, format_hint):
         # Determine if we have SQL results
         has_sql_data = sql_result.get("rows") and len(sql_result["rows"]) > 0
         
+        prefix, suffix, label = self.synthesize_layout(has_sql_data)
+        
+        # Size the data section so the whole prompt fits num_ctx
+        fixed = prefix + suffix.format(question=question, format_hint=format_hint, label=label, data="")
+        available = self.budget.available(fixed)
         if has_sql_data:
-            prompt = f"""Extract the answer from SQL results.
-            
-            Question: {question}
-            Format: {format_hint}
-            SQL Results: {json.dumps(sql_result["rows"])}
-            
-            Return JSON: {{"final_answer": <value>, "citations": ["table_name"]}}
-            """
+            data = fit_sql_result(sql_result, available)
         else:
-            prompt = f"""Answer from documents.
-            
-            Question: {question}
-            Format: {format_hint}
-            Documents: {json.dumps(docs)}
-            
-            Extract the answer from document content. Return JSON: {{"final_answer": <value>, "citations": [<doc_ids>]}}
-            """
+            data = fit_docs(docs, available)
+        prompt = prefix + suffix.format(question=question, format_hint=format_hint, label=label, data=data)
         
-        response = self._call_llm(prompt)
+        response = self._call_llm(prompt, models=self.models.get("synthesize"))
         return self._parse_json(response)
 
+    def _traced_generate(self, question, temperature=0.1, candidate=0, model=None, stop=None):
+        with self.tracer.span("generate_sql", candidate=candidate, temperature=temperature):
+            return self.generate_sql(question, temperature=temperature, model=model, stop=stop)
+
+    def _traced_execute(self, sql):
+        with self.tracer.span("execute"):
+            result = self.sqlite_tool.execute_query(sql)
+            self.tracer.annotate(rows=len(result["rows"]), sql_error=1 if result["error"] else 0)
+            return result
+
+    def _generate_with_escalation(self, question):
+        """Try the SQL model chain in order, moving up only when the SQL fails validation or execution."""
+        chain = self.models.get("generate_sql") or [self.model]
+        sql, sql_result = "", {}
+        for level, model in enumerate(chain):
+            if level > 0:
+                self.tracer.annotate(escalations=1)
+            candidate = self._traced_generate(question, model=model)
+            if not candidate:
+                continue
+            sql, sql_result = candidate, self._traced_execute(candidate)
+            if not sql_result["error"]:
+                break
+        return sql, sql_result
+
     def run(self, question, format_hint):
         # 1. Retrieve docs
-        docs = self.retrieval.retrieve(question)
+        with self.tracer.span("retrieve"):
+            docs = self.retrieval.retrieve(question)
         
-        # 2. Generate SQL
-        sql = self.generate_sql(question)
-        
-        # 3. Execute SQL
-        sql_result = {}
-        if sql:
-            sql_result = self.sqlite_tool.execute_query(sql)
+        # 2-3. Generate and execute SQL
+        kpi = None
+        if self.kpi_engine:
+            with self.tracer.span("kpi_engine"):
+                kpi = self.kpi_engine.answer(question)
+        if kpi:
+            sql, sql_result = kpi
+        elif self.sql_candidates > 1:
+            sql, sql_result = first_valid_sql(
+                lambda i, stop: self._traced_generate(question, temperature=candidate_temperature(i), candidate=i, stop=stop),
+                self._traced_execute,
+                format_hint,
+                self.sql_candidates
+            )
+        else:
+            sql, sql_result = self._generate_with_escalation(question)
             
         # 4. Synthesize
-        result = self.synthesize(question, sql_result, docs, format_hint)
+        with self.tracer.span("synthesize"):
+            result = self.synthesize(question, sql_result, docs, format_hint)
         
         return {
             "final_answer": result.get("final_answer"),
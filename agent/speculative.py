@@ -0,0 +1,95 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Tuple
+
+# Sampling temperatures for successive candidates; candidate 0 stays near-deterministic
+CANDIDATE_TEMPERATURES = [0.1, 0.4, 0.7, 1.0]
+
+
+def candidate_temperature(index: int) -> float:
+    if index < len(CANDIDATE_TEMPERATURES):
+        return CANDIDATE_TEMPERATURES[index]
+    return min(1.2, CANDIDATE_TEMPERATURES[-1] + 0.1 * (index - len(CANDIDATE_TEMPERATURES) + 1))
+
+
+def _is_number(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def is_shape_compatible(result: Dict[str, Any], format_hint: str) -> bool:
+    """Check that a SQL result can plausibly fill the requested answer format."""
+    if not result or result.get("error") or not result.get("rows"):
+        return False
+    hint = (format_hint or "").strip().lower()
+    columns = result.get("columns") or list(result["rows"][0].keys())
+    if hint in ("int", "float"):
+        return any(_is_number(v) for v in result["rows"][0].values())
+    fields = re.findall(r"(\w+)\s*:", hint)
+    if fields:
+        return len(columns) >= len(fields)
+    return True
+
+
+def first_valid_sql(
+    generate: Callable[[int, threading.Event], str],
+    execute: Callable[[str], Dict[str, Any]],
+    format_hint: str,
+    num_candidates: int,
+) -> Tuple[str, Dict[str, Any]]:
+    """Generate SQL candidates concurrently and keep the first usable one.
+
+    `generate(i, stop)` produces candidate i (callers vary temperature/prompt by
+    i) and should abandon its LLM call once `stop` is set. Candidates are
+    executed as they arrive; the first that runs without error and returns a
+    shape-compatible result wins and the others are cancelled.
+    If none qualifies, the first clean candidate with rows is returned, then
+    the first clean candidate, then the first generated SQL, then ("", {}).
+    """
+    stop = threading.Event()
+
+    def attempt(i: int):
+        if stop.is_set():
+            return "", {}
+        sql = generate(i, stop)
+        if not sql or stop.is_set():
+            return sql, {}
+        return sql, execute(sql)
+
+    pool = ThreadPoolExecutor(max_workers=num_candidates)
+    # Copy the caller's context so tracing spans opened in workers nest correctly
+    futures = [pool.submit(contextvars.copy_context().run, attempt, i) for i in range(num_candidates)]
+    fallbacks: List[Tuple[str, Dict[str, Any]]] = []
+    try:
+        for future in as_completed(futures):
+            try:
+                sql, result = future.result()
+            except Exception as e:
+                print(f"SQL candidate failed: {e}")
+                continue
+            if is_shape_compatible(result, format_hint):
+                stop.set()
+                return sql, result
+            if sql:
+                fallbacks.append((sql, result))
+    finally:
+        stop.set()
+        # In-flight candidates see `stop` and close their LLM streams; don't wait for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for needs_rows in (True, False):
+        for sql, result in fallbacks:
+            if result and not result.get("error") and (result.get("rows") or not needs_rows):
+                return sql, result
+    if fallbacks:
+        return fallbacks[0]
+    return "", {}
@@ -0,0 +1,446 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Cost of goods is not in Northwind; docs/kpi_definitions.md lets us approximate it
+COST_RATIO = 0.7
+CACHE_VERSION = 1
+
+KPI_COLUMNS = {
+    "revenue": "Revenue",
+    "aov": "AOV",
+    "gross_margin": "GrossMargin",
+    "quantity": "Quantity",
+    "orders": "Orders",
+}
+
+DIMENSIONS = {
+    "category": "CategoryName",
+    "product": "ProductName",
+    "customer": "CompanyName",
+}
+
+# Rows are sorted by (day, order, category, product), so "first row of a distinct
+# (order, category)" or "(order, product)" pair is a precomputed flag and
+# COUNT(DISTINCT OrderID) is a bincount over flagged rows. The flag must follow
+# the finest line-level dimension that is grouped or filtered on: with a
+# category filter, an order's first line may belong to another category.
+# Customer is per order, so it never needs a finer flag.
+DISTINCT_FLAGS = (
+    ("product", "new_order_product"),
+    ("category", "new_order_category"),
+)
+
+ORDER_DETAILS_TABLES = ("Order Details", "OrderDetails", "order_items")
+
+# Question constraints with no column in the cache (or not a plain aggregate)
+UNSUPPORTED = re.compile(
+    r"\b(suppliers?|employees?|shippers?|ship(ped|ping)?|freight|countr(y|ies)|cit(y|ies)|regions?|"
+    r"territor(y|ies)|discontinued|stock|reorder|unit price)\b|\border\s*#?\s*\d+"
+)
+# Filters and modifiers the matcher would otherwise drop silently: negation, discount
+# conditions, thresholds, comparisons and derived measures
+UNSUPPORTED_MODIFIERS = re.compile(
+    r"\b(excluding|exclude[sd]?|except|without|other than|apart from|besides|never|non)\b|n't\b|"
+    r"\bnot\b(?!\s+(?:available|provided|given)\b)|"
+    r"\bdiscounted\b|\b(?:with|without|no|any|full)\s+(?:a\s+)?discounts?\b|\bdiscount\s+(?:rate\s+)?(?:of|above|below|over|under)\b|"
+    r"\b(?:over|above|under|below|more than|less than|greater than|at least|at most)\s+\$?\d|[<>]=?\s*\$?\d|"
+    r"\b(vs\.?|versus|compared?|comparison|difference|growth|change|increase|decrease|"
+    r"percent(?:age)?|share|proportion|ratio)\b"
+)
+# Date windows other than a campaign, one month or one year; checked once campaign names are removed
+UNSUPPORTED_WINDOW = re.compile(
+    r"\b(?:19|20)\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b(?:between|since|before|after|until|through)\b|"
+    r"\bq[1-4]\b|\bquarter(?:s|ly)?\b|\bhalf\b|\bh[12]\b|\b(?:spring|summer|autumn|fall|winter|holidays?|christmas)\b|"
+    r"\b(?:days?|weeks?|weekly|daily|monthly|yearly|annual(?:ly)?|ytd|year to date)\b|"
+    r"\b(?:last|previous|past|this|current|next)\s+(?:year|month)\b|\b(?:per|by|each)\s+(?:month|year)\b"
+)
+MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december"
+QUOTED = re.compile(r"(?<!\w)'([^']+)'(?!\w)|\"([^\"]+)\"")
+# "customer Co3", "product P5", "company ALFKI": a capitalised/numeric name after the noun
+ENTITY_REFERENCE = re.compile(r"\b(?:customer|product|company|client)\s+([A-Z0-9][\w&.'-]*(?:\s+[A-Z0-9][\w&.'-]*)*)")
+
+
+def to_day(value) -> int:
+    """Days since 1970-01-01 for a 'YYYY-MM-DD' string or date."""
+    return int(np.datetime64(str(value)[:10], "D").astype(np.int64))
+
+
+def day_to_str(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def load_campaigns(path: str = "docs/marketing_calendar.md") -> Dict[str, Tuple[str, str]]:
+    """Campaign name -> (start, end) from the marketing calendar doc."""
+    campaigns = {}
+    if not os.path.exists(path):
+        return campaigns
+    name = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("## "):
+                name = line[3:].strip()
+                continue
+            match = re.search(r"Dates:\s*(\d{4}-\d{2}-\d{2})\s*to\s*(\d{4}-\d{2}-\d{2})", line)
+            if name and match:
+                campaigns[name] = (match.group(1), match.group(2))
+    return campaigns
+
+
+class KPIEngine:
+    """Vectorized KPIs over a columnar, memory-mapped cache of Northwind order lines.
+
+    The first use reads the source tables once and writes one `.npy` per column
+    to `cache_dir`; later processes mmap those files and never touch SQLite.
+    Results use SQLiteTool.execute_query's shape so they can stand in for SQL.
+    """
+
+    def __init__(self, db_path: str = "data/northwind.sqlite", cache_dir: str = ".cache/kpi",
+                 calendar_path: str = "docs/marketing_calendar.md"):
+        self.db_path = db_path
+        self.cache_dir = cache_dir
+        self.campaigns = load_campaigns(calendar_path)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._label_patterns: Dict[str, Any] = {}
+        self._label_lookup: Dict[str, Dict[str, str]] = {}
+
+    # ----- cache -----
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        stat = os.stat(self.db_path)
+        return {"version": CACHE_VERSION, "cost_ratio": COST_RATIO,
+                "db_size": stat.st_size, "db_mtime_ns": stat.st_mtime_ns}
+
+    def _read_source(self):
+        import pandas as pd
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            orders = pd.read_sql_query("SELECT OrderID, CustomerID, OrderDate FROM Orders", conn)
+            details = None
+            for table in ORDER_DETAILS_TABLES:
+                try:
+                    details = pd.read_sql_query(
+                        f'SELECT OrderID, ProductID, UnitPrice, Quantity, Discount FROM "{table}"', conn)
+                    break
+                except Exception:
+                    continue
+            if details is None:
+                raise ValueError(f"none of the order detail tables {ORDER_DETAILS_TABLES} exist")
+            products = pd.read_sql_query("SELECT ProductID, ProductName, CategoryID FROM Products", conn)
+            categories = pd.read_sql_query("SELECT CategoryID, CategoryName FROM Categories", conn)
+            customers = pd.read_sql_query("SELECT CustomerID, CompanyName FROM Customers", conn)
+        finally:
+            conn.close()
+
+        facts = (details
+                 .merge(orders, on="OrderID", how="inner")
+                 .merge(products, on="ProductID", how="left")
+                 .merge(categories, on="CategoryID", how="left")
+                 .merge(customers, on="CustomerID", how="left"))
+        facts["OrderDate"] = pd.to_datetime(facts["OrderDate"], errors="coerce", format="mixed")
+        facts = facts.dropna(subset=["OrderDate"])
+        facts["CategoryName"] = facts["CategoryName"].fillna("Unknown")
+        facts["ProductName"] = facts["ProductName"].fillna("Unknown")
+        facts["CompanyName"] = facts["CompanyName"].fillna(facts["CustomerID"]).fillna("Unknown")
+        return facts
+
+    def _build(self):
+        import pandas as pd
+
+        facts = self._read_source()
+        labels, codes = {}, {}
+        for dim, column in DIMENSIONS.items():
+            values, uniques = pd.factorize(facts[column], sort=True)
+            codes[dim] = values.astype(np.int32)
+            labels[dim] = [str(u) for u in uniques]
+
+        day = ((facts["OrderDate"].dt.normalize() - pd.Timestamp("1970-01-01")) // pd.Timedelta(days=1)).to_numpy(np.int32)
+        order_id = facts["OrderID"].to_numpy(np.int64)
+        order = np.lexsort((codes["product"], codes["category"], order_id, day))
+        day, order_id = day[order], order_id[order]
+        codes = {dim: values[order] for dim, values in codes.items()}
+
+        price = facts["UnitPrice"].to_numpy(np.float64)[order]
+        quantity = facts["Quantity"].to_numpy(np.float64)[order]
+        discount = facts["Discount"].fillna(0).to_numpy(np.float64)[order]
+        revenue = price * quantity * (1 - discount)
+
+        def first_of(*keys):
+            flag = np.ones(len(day), dtype=bool)
+            if len(day):
+                same = np.ones(len(day) - 1, dtype=bool)
+                for key in keys:
+                    same &= key[1:] == key[:-1]
+                flag[1:] = ~same
+            return flag
+
+        columns = {
+            "day": day,
+            "category": codes["category"],
+            "product": codes["product"],
+            "customer": codes["customer"],
+            "quantity": quantity,
+            "revenue": revenue,
+            # GM = SUM((UnitPrice - COST_RATIO * UnitPrice) * Quantity * (1 - Discount))
+            "gross_margin": revenue * (1 - COST_RATIO),
+            "new_order": first_of(order_id),
+            "new_order_category": first_of(order_id, codes["category"]),
+            "new_order_product": first_of(order_id, codes["product"]),
+        }
+        return columns, labels
+
+    def _save(self, columns, labels, fingerprint):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(self.cache_dir, f"{name}.npy"), values)
+        # Written last: a cache without meta.json is treated as missing
+        with open(os.path.join(self.cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "columns": sorted(columns), "labels": labels}, f)
+
+    def _load_cache(self, fingerprint) -> bool:
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["fingerprint"] != fingerprint:
+                return False
+            self.columns = {name: np.load(os.path.join(self.cache_dir, f"{name}.npy"), mmap_mode="r")
+                            for name in meta["columns"]}
+            self.labels = meta["labels"]
+            return True
+        except Exception as e:
+            print(f"KPI cache load error: {e}")
+            return False
+
+    def load(self):
+        """Mmap the columnar cache, rebuilding it first if the database changed."""
+        with self._lock:
+            if self.columns:
+                return
+            fingerprint = self._fingerprint()
+            if self._load_cache(fingerprint):
+                return
+            columns, labels = self._build()
+            try:
+                self._save(columns, labels, fingerprint)
+            except Exception as e:
+                print(f"KPI cache save error: {e}")
+            self.columns, self.labels = columns, labels
+
+    # ----- queries -----
+
+    def compute(self, kpi: str, start: Optional[str] = None, end: Optional[str] = None,
+                group_by: Optional[str] = None, filters: Optional[Dict[str, str]] = None,
+                top: Optional[int] = None, ascending: bool = False) -> Dict[str, Any]:
+        """One KPI over the inclusive [start, end] date window, optionally per dimension.
+
+        filters maps a dimension to a label, e.g. {"category": "Beverages"}.
+        """
+        if kpi not in KPI_COLUMNS:
+            raise ValueError(f"Unknown KPI '{kpi}', expected one of {sorted(KPI_COLUMNS)}")
+        if group_by is not None and group_by not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{group_by}', expected one of {sorted(DIMENSIONS)}")
+        self.load()
+        cols = self.columns
+
+        # Rows are sorted by day, so a date window is a contiguous slice
+        day = cols["day"]
+        lo = int(np.searchsorted(day, to_day(start), "left")) if start else 0
+        hi = int(np.searchsorted(day, to_day(end), "right")) if end else len(day)
+        window = slice(lo, hi)
+
+        mask = None
+        for dim, label in (filters or {}).items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dim}', expected one of {sorted(DIMENSIONS)}")
+            try:
+                code = self.labels[dim].index(label)
+            except ValueError:
+                return {"columns": [], "rows": [], "error": f"Unknown {dim} '{label}'"}
+            match = cols[dim][window] == code
+            mask = match if mask is None else mask & match
+
+        def take(name):
+            values = cols[name][window]
+            return values[mask] if mask is not None else values
+
+        size = len(self.labels[group_by]) if group_by else 1
+        groups = take(group_by) if group_by else np.zeros(hi - lo if mask is None else int(mask.sum()), dtype=np.int32)
+
+        def total(name):
+            return np.bincount(groups, weights=take(name), minlength=size)
+
+        involved = {group_by, *(filters or {})}
+        flag = next((name for dim, name in DISTINCT_FLAGS if dim in involved), "new_order")
+
+        def distinct_orders():
+            flags = take(flag)
+            return np.bincount(groups[flags], minlength=size).astype(np.float64)
+
+        if kpi == "aov":
+            orders = distinct_orders()
+            values = np.divide(total("revenue"), orders, out=np.zeros(size), where=orders > 0)
+            present = orders > 0
+        elif kpi == "orders":
+            values = distinct_orders()
+            present = values > 0
+        else:
+            values = total(kpi)
+            present = np.bincount(groups, minlength=size) > 0
+
+        column = KPI_COLUMNS[kpi]
+        as_int = kpi in ("quantity", "orders")
+        if group_by is None:
+            value = values[0] if present[0] else None
+            if value is not None:
+                value = int(round(value)) if as_int else float(value)
+            return {"columns": [column], "rows": [{column: value}], "error": None}
+
+        idx = np.flatnonzero(present)
+        ranked = idx[np.argsort(values[idx] if ascending else -values[idx], kind="stable")]
+        if top:
+            ranked = ranked[:top]
+        label_column = DIMENSIONS[group_by]
+        rows = [{label_column: self.labels[group_by][i],
+                 column: int(round(values[i])) if as_int else float(values[i])} for i in ranked]
+        return {"columns": [label_column, column], "rows": rows, "error": None}
+
+    # ----- question matching -----
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """Rule-based mapping of a KPI question to compute() arguments; None if it is not one."""
+        text = question.lower()
+        if re.search(r"\bpolic(y|ies)\b|\breturn window\b|what is the (definition|formula)", text):
+            return None
+        if re.search(r"average order value|\baov\b", text):
+            kpi = "aov"
+        elif re.search(r"gross margin|\bmargin\b", text):
+            kpi = "gross_margin"
+        elif re.search(r"\brevenue\b|\bsales\b", text):
+            kpi = "revenue"
+        elif re.search(r"\bquantity\b|\bunits\b", text):
+            kpi = "quantity"
+        elif re.search(r"(how many|number of) orders\b", text):
+            kpi = "orders"
+        else:
+            return None
+
+        # Constraints the engine cannot express; leave those to SQL generation
+        if UNSUPPORTED.search(text) or UNSUPPORTED_MODIFIERS.search(text):
+            return None
+        # compute() only has AOV as a per-order mean
+        if kpi != "aov" and re.search(r"\b(average|avg|mean|median|per order)\b", text):
+            return None
+
+        start = end = None
+        original = question
+        for name, (first, last) in self.campaigns.items():
+            if name.lower() in text:
+                start, end = first, last
+                # Campaign names mention categories that are not filters
+                text = text.replace(name.lower(), " ")
+                original = re.sub(re.escape(name), " ", original, flags=re.IGNORECASE)
+                break
+        if UNSUPPORTED_WINDOW.search(text):
+            return None
+        years = set(re.findall(r"\b(?:19|20)\d{2}\b", text))
+        # "may" only counts as a month next to a year or after a preposition
+        month_names = {name for name in re.findall(rf"\b({MONTHS})\b", text)
+                       if name != "may" or re.search(r"\b(in|during|of|for)\s+may\b|\bmay\s+(?:of\s+)?\d{4}", text)}
+        if len(years) > 1 or len(month_names) > 1 or (start is not None and (years or month_names)):
+            return None
+        if start is None:
+            month = re.search(rf"\b({MONTHS})\s+(?:of\s+)?((?:19|20)\d{{2}})\b", text)
+            year = re.search(r"\b((?:19|20)\d{2})\b", text)
+            if month_names and not month:
+                # A month without its year is not a window compute() can take
+                return None
+            if month:
+                number = MONTHS.split("|").index(month.group(1)) + 1
+                first = np.datetime64(f"{month.group(2)}-{number:02d}", "M")
+                start, end = str(first.astype("datetime64[D]")), str((first + 1).astype("datetime64[D]") - 1)
+            elif year:
+                start, end = f"{year.group(1)}-01-01", f"{year.group(1)}-12-31"
+
+        # Labels are only known once the cache is loaded
+        self.load()
+        filters, matched = {}, []
+        for dim in DIMENSIONS:
+            found = self._label_pattern(dim).findall(text)
+            if found:
+                label = max(found, key=len)
+                filters[dim] = self._label_lookup[dim][label]
+                matched.append(label)
+
+        # A named entity the engine could not resolve would otherwise be silently
+        # dropped, answering for all products/customers instead
+        quoted = [single or double for single, double in QUOTED.findall(original)]
+        for entity in quoted + ENTITY_REFERENCE.findall(original):
+            entity = entity.strip(" .,?!").lower()
+            if entity and not any(entity in label or label in entity for label in matched):
+                return None
+
+        group_by = None
+        ranking = re.search(r"\b(which|top|highest|lowest|best|worst|most|least|by|per|each)\b", text)
+        if ranking:
+            if "category" not in filters and re.search(r"\bcategor(y|ies)\b", text):
+                group_by = "category"
+            elif "customer" not in filters and re.search(r"\bcustomers?\b", text):
+                group_by = "customer"
+            elif "product" not in filters and re.search(r"\bproducts?\b", text):
+                group_by = "product"
+
+        top = None
+        ascending = bool(re.search(r"\b(lowest|worst|least)\b", text))
+        if group_by:
+            top_n = re.search(r"\btop\s+(\d+)\b", text)
+            if top_n:
+                top = int(top_n.group(1))
+            elif re.search(r"\b(which|top|highest|lowest|best|worst|most|least)\b", text):
+                top = 1
+
+        return {"kpi": kpi, "start": start, "end": end, "group_by": group_by,
+                "filters": filters, "top": top, "ascending": ascending}
+
+    def _label_pattern(self, dim: str):
+        """One compiled alternation of a dimension's labels (longest first), built on first use."""
+        if dim not in self._label_patterns:
+            labels = sorted(self.labels.get(dim, []), key=len, reverse=True)
+            self._label_lookup[dim] = {label.lower(): label for label in labels}
+            alternation = "|".join(re.escape(label.lower()) for label in labels) or r"(?!)"
+            self._label_patterns[dim] = re.compile(rf"(?<!\w)({alternation})(?!\w)")
+        return self._label_patterns[dim]
+
+    def describe(self, spec: Dict[str, Any]) -> str:
+        """SQL-comment label for the `sql` field of an engine-answered question."""
+        parts = [spec["kpi"], f"{spec['start'] or '*'}..{spec['end'] or '*'}"]
+        parts += [f"{dim}={label}" for dim, label in spec["filters"].items()]
+        if spec["group_by"]:
+            parts.append(f"by={spec['group_by']}")
+        if spec["top"]:
+            parts.append(f"{'bottom' if spec['ascending'] else 'top'}={spec['top']}")
+        return "-- kpi_engine: " + " ".join(parts)
+
+    def answer(self, question: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(label, result) when the question is a KPI the engine covers, else None."""
+        try:
+            spec = self.match(question)
+            if spec is None:
+                return None
+            result = self.compute(**spec)
+        except Exception as e:
+            print(f"KPI engine error: {e}")
+            return None
+        if result["error"]:
+            return None
+        return self.describe(spec), result
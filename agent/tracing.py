@@ -0,0 +1,172 @@
+import collections
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Linear-interpolated percentile (p in 0..100) without pulling in numpy."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class Tracer:
+    """Collects timed spans for agent stages.
+
+    Each span records wall time plus free-form attributes. Numeric attributes
+    added through `annotate` accumulate (token counts, cache hits, retries), so
+    several LLM calls inside one stage sum up on that stage's span.
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: Optional[int] = None):
+        self.enabled = enabled
+        # Long-running processes keep only the most recent spans
+        self.spans = collections.deque(maxlen=max_spans) if max_spans else []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._next_id = 0
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        with self._lock:
+            self._next_id += 1
+            span_id = self._next_id
+        record = {
+            "id": span_id,
+            "parent": parent["id"] if parent else None,
+            "trace": attrs.pop("trace", None) or (parent["trace"] if parent else None),
+            "stage": stage,
+            "thread": threading.get_ident(),
+            "start_ms": (time.perf_counter() - self._origin) * 1000,
+            "duration_ms": 0.0,
+            "attrs": dict(attrs),
+            # Attributes given at open are descriptive tags, not counters to sum
+            "tags": sorted(attrs),
+        }
+        token = _current_span.set(record)
+        try:
+            yield record
+        except Exception as e:
+            record["attrs"]["error"] = str(e)
+            raise
+        finally:
+            record["duration_ms"] = (time.perf_counter() - self._origin) * 1000 - record["start_ms"]
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(record)
+
+    def annotate(self, **attrs):
+        """Attach attributes to the innermost open span; numbers are summed."""
+        record = _current_span.get()
+        if record is None:
+            return
+        with self._lock:
+            for key, value in attrs.items():
+                current = record["attrs"].get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(current, (int, float)):
+                    record["attrs"][key] = current + value
+                else:
+                    record["attrs"][key] = value
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        """Return `fn` wrapped in a span named `stage`."""
+        def traced(*args, **kwargs):
+            with self.span(stage):
+                return fn(*args, **kwargs)
+        traced.__name__ = getattr(fn, "__name__", stage)
+        return traced
+
+    def export_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for record in sorted(self.spans, key=lambda r: r["start_ms"]):
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def export_chrome(self, path: str):
+        """Write Chrome trace-event JSON (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        events = []
+        for record in self.spans:
+            args = dict(record["attrs"])
+            if record["trace"]:
+                args["trace"] = record["trace"]
+            events.append({
+                "name": record["stage"],
+                "cat": "agent",
+                "ph": "X",
+                "ts": round(record["start_ms"] * 1000, 1),
+                "dur": round(record["duration_ms"] * 1000, 1),
+                "pid": pid,
+                "tid": record["thread"],
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def summary(self, by: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-stage count, p50/p95/max latency and summed numeric attributes.
+
+        `by` names a span attribute (e.g. "model") to break stages down further.
+        """
+        by_stage: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            records = list(self.spans)
+        for record in records:
+            key = record["stage"]
+            if by and by in record["attrs"]:
+                key = f"{key}[{record['attrs'][by]}]"
+            by_stage.setdefault(key, []).append(record)
+        summary = {}
+        for stage, records in by_stage.items():
+            durations = [r["duration_ms"] for r in records]
+            totals: Dict[str, float] = {}
+            for r in records:
+                for key, value in r["attrs"].items():
+                    if key in r.get("tags", ()):
+                        continue
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        totals[key] = totals.get(key, 0) + value
+            summary[stage] = {
+                "count": len(records),
+                "p50_ms": round(percentile(durations, 50), 2),
+                "p95_ms": round(percentile(durations, 95), 2),
+                "max_ms": round(max(durations), 2),
+                "total_ms": round(sum(durations), 2),
+                **totals,
+            }
+        return summary
+
+    def print_summary(self, by: Optional[str] = None):
+        summary = self.summary(by)
+        if not summary:
+            return
+        width = max(16, max(len(stage) for stage in summary) + 2)
+        print(f"\n{'stage':<{width}}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'prompt tok':>12}{'resp tok':>10}")
+        for stage, row in sorted(summary.items(), key=lambda kv: -kv[1]["total_ms"]):
+            print(f"{stage:<{width}}{row['count']:>7}{row['p50_ms']:>11.1f}{row['p95_ms']:>11.1f}"
+                  f"{int(row.get('prompt_tokens', 0)):>12}{int(row.get('response_tokens', 0)):>10}")
+        extras = {}
+        for row in summary.values():
+            for key in ("cache_hits", "retries", "escalations", "llm_calls", "llm_errors"):
+                if key in row:
+                    extras[key] = extras.get(key, 0) + row[key]
+        if extras:
+            print(", ".join(f"{k}={int(v)}" for k, v in extras.items()))
+
+
+# Shared no-op tracer for agents constructed without one
+NULL_TRACER = Tracer(enabled=False)
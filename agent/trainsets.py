@@ -0,0 +1,116 @@
+# Labeled examples and optimizer settings for the DSPy modules. Kept as plain
+# data (no dspy import) so HybridAgent can hash them cheaply at startup to find
+# a matching compiled program.
+
+ROUTER_TRAINSET = [
+    {"question": "What is the return policy for unopened beverages?", "tool": "rag"},
+    {"question": "How many orders were placed in 1997?", "tool": "sql"},
+    {"question": "What was the total revenue for Beverages in Summer 1997?", "tool": "hybrid"},
+    {"question": "List the top 5 products by unit price.", "tool": "sql"},
+    {"question": "Who is the contact person for Alfreds Futterkiste?", "tool": "sql"},
+    {"question": "What are the KPI definitions for Gross Margin?", "tool": "rag"},
+    {"question": "Calculate the average order value for Winter Classics 1997.", "tool": "hybrid"},
+    {"question": "Show me the marketing calendar for 1997.", "tool": "rag"},
+    {"question": "Which supplier provides Exotic Liquids?", "tool": "sql"},
+    {"question": "What is the return window for produce?", "tool": "rag"},
+]
+
+SQL_TRAINSET = [
+    {
+        "question": "How many orders were placed in 1997?",
+        "sql_query": "SELECT COUNT(*) FROM Orders WHERE strftime('%Y', OrderDate) = '1997'",
+    },
+    {
+        "question": "Top 3 products by total revenue all-time.",
+        "sql_query": "SELECT p.ProductName, SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) AS Revenue FROM \"Order Details\" od JOIN Products p ON od.ProductID = p.ProductID GROUP BY p.ProductID ORDER BY Revenue DESC LIMIT 3",
+    },
+    {
+        "question": "Which product category had the highest total quantity sold in June 1997?",
+        "sql_query": "SELECT c.CategoryName, SUM(od.Quantity) AS Quantity FROM \"Order Details\" od JOIN Orders o ON od.OrderID = o.OrderID JOIN Products p ON od.ProductID = p.ProductID JOIN Categories c ON p.CategoryID = c.CategoryID WHERE o.OrderDate BETWEEN '1997-06-01' AND '1997-06-30 23:59:59' GROUP BY c.CategoryName ORDER BY Quantity DESC LIMIT 1",
+    },
+    {
+        "question": "What was the average order value in December 1997?",
+        "sql_query": "SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) / COUNT(DISTINCT o.OrderID), 2) FROM \"Order Details\" od JOIN Orders o ON od.OrderID = o.OrderID WHERE o.OrderDate BETWEEN '1997-12-01' AND '1997-12-31 23:59:59'",
+    },
+    {
+        "question": "Total revenue from the Beverages category in June 1997.",
+        "sql_query": "SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) FROM \"Order Details\" od JOIN Orders o ON od.OrderID = o.OrderID JOIN Products p ON od.ProductID = p.ProductID JOIN Categories c ON p.CategoryID = c.CategoryID WHERE c.CategoryName = 'Beverages' AND o.OrderDate BETWEEN '1997-06-01' AND '1997-06-30 23:59:59'",
+    },
+    {
+        "question": "Top customer by gross margin in 1997, with cost approximated as 70% of unit price.",
+        "sql_query": "SELECT cu.CompanyName, ROUND(SUM((od.UnitPrice - 0.7 * od.UnitPrice) * od.Quantity * (1 - od.Discount)), 2) AS Margin FROM \"Order Details\" od JOIN Orders o ON od.OrderID = o.OrderID JOIN Customers cu ON o.CustomerID = cu.CustomerID WHERE strftime('%Y', o.OrderDate) = '1997' GROUP BY cu.CustomerID ORDER BY Margin DESC LIMIT 1",
+    },
+    {
+        "question": "List the top 5 products by unit price.",
+        "sql_query": "SELECT ProductName, UnitPrice FROM Products ORDER BY UnitPrice DESC LIMIT 5",
+    },
+    {
+        "question": "How many products are in the Seafood category?",
+        "sql_query": "SELECT COUNT(*) FROM Products p JOIN Categories c ON p.CategoryID = c.CategoryID WHERE c.CategoryName = 'Seafood'",
+    },
+]
+
+SYNTHESIZE_TRAINSET = [
+    {
+        "question": "According to the product policy, what is the return window (days) for unopened Beverages? Return an integer.",
+        "format_hint": "int",
+        "sql_query": "",
+        "sql_result": "No SQL result.",
+        "retrieved_docs": "[product_policy::chunk0]\n# Returns & Policy\n- Perishables (Produce, Seafood, Dairy): 3-7 days.\n- Beverages unopened: 14 days; opened: no returns.\n- Non-perishables: 30 days.",
+        "final_answer": 14,
+    },
+    {
+        "question": "Which product category had the highest total quantity sold? Return {category:str, quantity:int}.",
+        "format_hint": "{category:str, quantity:int}",
+        "sql_query": "SELECT c.CategoryName, SUM(od.Quantity) AS Quantity FROM ... LIMIT 1",
+        "sql_result": "SQL Results (CSV, header first):\nCategoryName,Quantity\nBeverages,1842",
+        "retrieved_docs": "No documents.",
+        "final_answer": {"category": "Beverages", "quantity": 1842},
+    },
+    {
+        "question": "What was the Average Order Value? Return a float rounded to 2 decimals.",
+        "format_hint": "float",
+        "sql_query": "SELECT ROUND(SUM(...) / COUNT(DISTINCT o.OrderID), 2) FROM ...",
+        "sql_result": "SQL Results (CSV, header first):\nAOV\n1523.4567",
+        "retrieved_docs": "[kpi_definitions::chunk1]\n## Average Order Value (AOV)\n- AOV = SUM(UnitPrice * Quantity * (1 - Discount)) / COUNT(DISTINCT OrderID)",
+        "final_answer": 1523.46,
+    },
+    {
+        "question": "Top 2 products by total revenue. Return list[{product:str, revenue:float}].",
+        "format_hint": "list[{product:str, revenue:float}]",
+        "sql_query": "SELECT p.ProductName, SUM(...) AS Revenue FROM ... LIMIT 2",
+        "sql_result": "SQL Results (CSV, header first):\nProductName,Revenue\nCôte de Blaye,141396.735\nThüringer Rostbratwurst,80368.6724",
+        "retrieved_docs": "No documents.",
+        "final_answer": [{"product": "Côte de Blaye", "revenue": 141396.74}, {"product": "Thüringer Rostbratwurst", "revenue": 80368.67}],
+    },
+    {
+        "question": "Who was the top customer by gross margin? Return {customer:str, margin:float}.",
+        "format_hint": "{customer:str, margin:float}",
+        "sql_query": "SELECT cu.CompanyName, SUM(...) AS Margin FROM ... LIMIT 1",
+        "sql_result": "SQL Results (CSV, header first):\nCompanyName,Margin\nQUICK-Stop,18093.2931",
+        "retrieved_docs": "[kpi_definitions::chunk2]\n## Gross Margin\n- GM = SUM((UnitPrice - CostOfGoods) * Quantity * (1 - Discount))",
+        "final_answer": {"customer": "QUICK-Stop", "margin": 18093.29},
+    },
+]
+
+# Per-program optimizer settings; part of the compiled-program cache key
+OPTIMIZER_CONFIGS = {
+    "router": {"optimizer": "BootstrapFewShot", "max_bootstrapped_demos": 3, "max_labeled_demos": 3},
+    "sql_generator": {"optimizer": "BootstrapFewShotWithRandomSearch", "max_bootstrapped_demos": 3,
+                      "max_labeled_demos": 3, "num_candidate_programs": 4},
+    "synthesizer": {"optimizer": "BootstrapFewShotWithRandomSearch", "max_bootstrapped_demos": 2,
+                    "max_labeled_demos": 2, "num_candidate_programs": 4},
+}
+
+TRAINSETS = {
+    "router": ROUTER_TRAINSET,
+    "sql_generator": SQL_TRAINSET,
+    "synthesizer": SYNTHESIZE_TRAINSET,
+}
+
+# Inputs that are the same for every example are dropped from compiled demos:
+# the adapter formats every field of every demo, so a 3-demo GenerateSQL program
+# would carry the schema four times and overflow num_ctx.
+DEMO_EXCLUDED_FIELDS = {
+    "sql_generator": ("db_schema",),
+}
@@ -0,0 +1,83 @@
+"""Microbenchmarks for the non-LLM hot paths: retrieval, SQL execution, schema introspection, KPI engine."""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, Any, List
+
+from agent.tracing import percentile
+
+SQL_QUERIES = [
+    "SELECT COUNT(*) FROM Orders",
+    "SELECT c.CategoryName, SUM(od.Quantity) AS Total FROM Categories c JOIN Products p ON c.CategoryID = p.CategoryID "
+    "JOIN \"Order Details\" od ON p.ProductID = od.ProductID GROUP BY c.CategoryName ORDER BY Total DESC",
+    "SELECT p.ProductName, SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) AS Revenue FROM Products p "
+    "JOIN \"Order Details\" od ON p.ProductID = od.ProductID GROUP BY p.ProductID ORDER BY Revenue DESC LIMIT 3",
+]
+
+# KPI-engine counterparts of the grouped aggregates in SQL_QUERIES
+KPI_QUERIES = [
+    {"kpi": "quantity", "group_by": "category"},
+    {"kpi": "revenue", "group_by": "product", "top": 3},
+    {"kpi": "aov", "start": "1997-06-01", "end": "1997-06-30", "group_by": "category"},
+]
+
+
+def bench(fn: Callable[[int], Any], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    """Time `fn(i)` per call; returns latency percentiles in ms and ops/s."""
+    for i in range(warmup):
+        fn(i)
+    durations: List[float] = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        durations.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return {
+        "iterations": iterations,
+        "mean_ms": round(sum(durations) / len(durations), 4),
+        "p50_ms": round(percentile(durations, 50), 4),
+        "p95_ms": round(percentile(durations, 95), 4),
+        "p99_ms": round(percentile(durations, 99), 4),
+        "ops_per_s": round(iterations / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def run_micro(questions: List[str], iterations: int = 200, db_path: str = "data/northwind.sqlite",
+              docs_dir: str = "docs") -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+
+    from agent.rag.retrieval import Retrieval
+    retrieval = Retrieval(docs_dir)
+    results["retrieval.retrieve"] = bench(lambda i: retrieval.retrieve(questions[i % len(questions)]), iterations)
+
+    if not os.path.exists(db_path):
+        results["sqlite"] = {"skipped": f"{db_path} not found"}
+        return results
+
+    from agent.tools.sqlite_tool import SQLiteTool
+    tool = SQLiteTool(db_path)
+    results["sqlite_tool.execute_query"] = bench(lambda i: tool.execute_query(SQL_QUERIES[i % len(SQL_QUERIES)]), iterations)
+    results["sqlite_tool.get_schema"] = bench(lambda i: tool.get_schema(), max(10, iterations // 10))
+
+    from agent.tools.kpi_engine import KPIEngine
+    engine = KPIEngine(db_path)
+    results["kpi_engine.compute"] = bench(lambda i: engine.compute(**KPI_QUERIES[i % len(KPI_QUERIES)]), iterations)
+    results["kpi_engine.answer"] = bench(lambda i: engine.answer(questions[i % len(questions)]), iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run retrieval/SQLite microbenchmarks")
+    parser.add_argument("--questions", default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = [json.loads(line)["question"] for line in f if line.strip()]
+    print(json.dumps(run_micro(questions, args.iterations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Measure prompt prefill through the full SimpleAgent pipeline, old vs static-prefix layout.
+
+Each layout answers the eval set with `agent.run`, so SQL and synthesize
+prompts interleave exactly as in a batch run. That matters: with a single
+Ollama slot (OLLAMA_NUM_PARALLEL=1) every synthesize prompt replaces the
+cached SQL prefix, and the layout alone saves little. Prefill is read from
+Ollama's own numbers (prompt_eval_count / prompt_eval_duration) per stage.
+The first pass of each layout warms the model and is not reported.
+
+    python -m benchmarks.prefill --batch sample_questions_hybrid_eval.jsonl --repeat 3 --out prefill.json
+"""
+import argparse
+import json
+from typing import Any, Dict, List
+
+from agent.simple_agent import SimpleAgent
+from agent.tracing import Tracer
+
+STAGES = ("generate_sql", "synthesize")
+
+# Pre-refactor prompts: question and data interpolated mid-prompt with indentation
+LEGACY_SQL_TEMPLATE = """You are a SQLite expert. Generate a query based on examples.
+
+        Schema:
+        {schema}
+
+        Examples:
+        Q: "What is the total revenue in 1997?"
+        A: {{"sql": "SELECT SUM(UnitPrice * Quantity) FROM OrderDetails od JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y', o.OrderDate) = '1997'"}}
+
+        Q: "Which category sold the most in June 1997?"
+        A: {{"sql": "SELECT c.CategoryName, SUM(od.Quantity) as Total FROM Categories c JOIN Products p ON c.CategoryID = p.CategoryID JOIN OrderDetails od ON p.ProductID = od.ProductID JOIN Orders o ON od.OrderID = o.OrderID WHERE strftime('%Y-%m', o.OrderDate) = '1997-06' GROUP BY c.CategoryName ORDER BY Total DESC LIMIT 1"}}
+
+        Q: "Top 3 products by revenue?"
+        A: {{"sql": "SELECT p.ProductName, SUM(od.UnitPrice * od.Quantity * (1 - COALESCE(od.Discount, 0))) as Revenue FROM Products p JOIN OrderDetails od ON p.ProductID = od.ProductID GROUP BY p.ProductID, p.ProductName ORDER BY Revenue DESC LIMIT 3"}}
+
+        Now generate for: "{question}"
+        Return JSON: {{"sql": "..."}}
+        """
+
+LEGACY_SYNTHESIZE_SQL = """Extract the answer from SQL results.
+
+            Question: {question}
+            Format: {format_hint}
+            SQL Results (CSV, header first):
+            {data}
+
+            Return JSON: {{"final_answer": <value>, "citations": ["table_name"]}}
+            """
+
+LEGACY_SYNTHESIZE_DOCS = """Answer from documents.
+
+            Question: {question}
+            Format: {format_hint}
+            Documents:
+            {data}
+
+            Extract the answer from document content. Return JSON: {{"final_answer": <value>, "citations": [<doc_ids>]}}
+            """
+
+
+class LegacyLayoutAgent(SimpleAgent):
+    """SimpleAgent with the prompt layout from before the static-prefix refactor."""
+
+    def sql_prompt(self, question):
+        return LEGACY_SQL_TEMPLATE.format(schema=self.schema, question=question)
+
+    def synthesize_layout(self, has_sql_data):
+        return "", LEGACY_SYNTHESIZE_SQL if has_sql_data else LEGACY_SYNTHESIZE_DOCS, ""
+
+
+def measure(agent: SimpleAgent, items: List[Dict], repeat: int) -> Dict[str, Any]:
+    # Warm-up pass: model load and first prefill are not what the layout changes
+    agent.tracer = Tracer()
+    for item in items:
+        agent.run(item["question"], item["format_hint"])
+
+    tracer = Tracer()
+    agent.tracer = tracer
+    for _ in range(max(1, repeat - 1)):
+        for item in items:
+            with tracer.span("question"):
+                agent.run(item["question"], item["format_hint"])
+
+    summary = tracer.summary()
+    questions = summary.get("question", {}).get("count", 0)
+    report: Dict[str, Any] = {"questions": questions}
+    for stage in STAGES:
+        row = summary.get(stage, {})
+        calls = max(1, row.get("llm_calls", 0))
+        report[stage] = {
+            "llm_calls": row.get("llm_calls", 0),
+            "mean_prompt_tokens_evaluated": round(row.get("prompt_tokens", 0) / calls, 1),
+            "mean_prefill_ms": round(row.get("prefill_ms", 0) / calls, 1),
+            "p50_ms": row.get("p50_ms", 0.0),
+        }
+    # Token counts are annotated on the stage spans, so per-question totals are their sum
+    report["per_question"] = {
+        "prompt_tokens_evaluated": round(sum(summary.get(s, {}).get("prompt_tokens", 0) for s in STAGES) / max(1, questions), 1),
+        "mean_prefill_ms": round(sum(summary.get(s, {}).get("prefill_ms", 0) for s in STAGES) / max(1, questions), 1),
+        "p50_ms": summary.get("question", {}).get("p50_ms", 0.0),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pipeline prefill of the old and static-prefix prompt layouts")
+    parser.add_argument("--batch", default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--api-url", default="http://localhost:11434/api/generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the eval set per layout (first is warm-up)")
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.batch, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+
+    results: Dict[str, Any] = {}
+    # Legacy first so the static prefix cannot benefit from a cache it warmed itself
+    for name, agent_cls in (("legacy_inline", LegacyLayoutAgent), ("static_prefix", SimpleAgent)):
+        agent = agent_cls()
+        agent.api_url = args.api_url
+        results[name] = measure(agent, items, args.repeat)
+
+    # Relative change of measured prefill per stage; not meaningful against the stub
+    # server, which has no prompt cache
+    results["prefill_change_pct"] = {}
+    for stage in STAGES + ("per_question",):
+        old = results["legacy_inline"][stage]["mean_prefill_ms"]
+        new = results["static_prefix"][stage]["mean_prefill_ms"]
+        results["prefill_change_pct"][stage] = round((new - old) / old * 100, 1) if old else None
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""End-to-end offline benchmark: agent pipeline against the stub LLM server.
+
+Writes a JSON report with a stable layout so two runs can be diffed:
+    python -m benchmarks.run --questions 500 --out bench_before.json
+    python -m benchmarks.run --questions 500 --out bench_after.json --compare bench_before.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from agent.tracing import Tracer, percentile
+from benchmarks.micro import run_micro
+from benchmarks.startup import measure_startup
+from benchmarks.stub_llm import StubLLMServer, STUB_AGENTS
+from benchmarks.synth_questions import generate
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def latency_stats(durations: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "count": len(durations),
+        "throughput_qps": round(len(durations) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(sum(durations) / len(durations), 2) if durations else 0.0,
+        "p50_ms": round(percentile(durations, 50), 2),
+        "p95_ms": round(percentile(durations, 95), 2),
+        "p99_ms": round(percentile(durations, 99), 2),
+        "max_ms": round(max(durations), 2) if durations else 0.0,
+    }
+
+
+def run_end_to_end(items: List[Dict], api_base: str, concurrency: int, kind: str, sql_candidates: int,
+                   kpi_engine: bool = False) -> Dict[str, Any]:
+    from agent.factory import create_agent
+
+    tracer = Tracer()
+    agent = create_agent(kind, tracer=tracer, api_base=api_base, sql_candidates=sql_candidates, kpi_engine=kpi_engine)
+
+    durations: List[float] = []
+    errors = 0
+
+    def answer(item):
+        t0 = time.perf_counter()
+        with tracer.span("question", trace=item["id"]):
+            agent.run(item["question"], item["format_hint"])
+        return (time.perf_counter() - t0) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(answer, item) for item in items]:
+            try:
+                durations.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"Benchmark item failed: {e}")
+    elapsed = time.perf_counter() - start
+
+    return {
+        **latency_stats(durations, elapsed),
+        "errors": errors,
+        "wall_s": round(elapsed, 3),
+        "stages": tracer.summary(),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print relative change of the headline numbers versus a previous report."""
+    print(f"\n{'metric':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+    rows = [("end_to_end." + k, baseline["end_to_end"].get(k), current["end_to_end"].get(k))
+            for k in ("throughput_qps", "p50_ms", "p95_ms", "p99_ms")]
+    if "startup" in current and "startup" in baseline:
+        rows.append(("startup.total_s", baseline["startup"]["total_s"], current["startup"]["total_s"]))
+    for name, stats in current.get("micro", {}).items():
+        if "p50_ms" in stats and "p50_ms" in baseline.get("micro", {}).get(name, {}):
+            rows.append((name + ".p50_ms", baseline["micro"][name]["p50_ms"], stats["p50_ms"]))
+    for name, old, new in rows:
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{name:<36}{old:>12.2f}{new:>12.2f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with a stub LLM")
+    parser.add_argument("--questions", type=int, default=200, help="Number of synthetic questions")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Stub seconds per generated token")
+    parser.add_argument("--prefill-latency", type=float, default=0.0001, help="Stub seconds per prompt token")
+    parser.add_argument("--responses", help="JSONL of canned/replayed stub responses")
+    parser.add_argument("--agent", choices=STUB_AGENTS, default="simple")
+    parser.add_argument("--sql-candidates", type=int, default=1)
+    parser.add_argument("--kpi-engine", action="store_true", help="Answer KPI questions with the vectorized engine")
+    parser.add_argument("--micro-iterations", type=int, default=200)
+    parser.add_argument("--out", default="bench_output.json")
+    parser.add_argument("--compare", help="Previous report to compare against")
+    args = parser.parse_args()
+
+    items = generate(args.questions)
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+        }
+    }
+
+    report["micro"] = run_micro([item["question"] for item in items], args.micro_iterations)
+
+    with StubLLMServer(token_latency=args.token_latency, prefill_latency=args.prefill_latency,
+                       responses_path=args.responses) as stub:
+        api_base = stub.url.rsplit("/api/", 1)[0]
+        # Fresh process, so it pays the real cold start (imports, index, schema)
+        report["startup"] = measure_startup(args.agent, api_base)
+        report["end_to_end"] = run_end_to_end(items, api_base, args.concurrency, args.agent, args.sql_candidates,
+                                               args.kpi_engine)
+        report["meta"]["llm_requests"] = stub.requests_served
+        report["meta"]["llm_requests_cancelled"] = stub.requests_cancelled
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    e2e = report["end_to_end"]
+    print(f"{e2e['count']} questions in {e2e['wall_s']}s: {e2e['throughput_qps']} q/s, "
+          f"p50 {e2e['p50_ms']} ms, p95 {e2e['p95_ms']} ms, errors {e2e['errors']}")
+    print(f"Cold start to first answer: {report['startup']['total_s']}s")
+    print(f"Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
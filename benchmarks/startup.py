@@ -0,0 +1,78 @@
+"""Cold-start measurement: import profile and time to first answer in a fresh process.
+
+    python -m benchmarks.startup --agent simple --target-s 3.0
+
+The child process imports the factory, builds the agent and answers one
+question against the stub LLM, under `python -X importtime`. Exits non-zero
+when time to first answer exceeds the target so it can gate CI.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.stub_llm import StubLLMServer, STUB_AGENTS
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+from agent.factory import create_agent
+t1 = time.perf_counter()
+agent = create_agent({kind!r}, api_base={api_base!r})
+t2 = time.perf_counter()
+agent.run("How many orders were placed in 1997?", "int")
+t3 = time.perf_counter()
+print("STARTUP " + json.dumps({{"import_s": t1 - t0, "init_s": t2 - t1, "first_answer_s": t3 - t2, "total_s": t3 - t0}}))
+"""
+
+
+def parse_importtime(stderr: str, top: int = 15) -> List[Dict[str, Any]]:
+    """Packages ranked by cumulative import time from `-X importtime` output."""
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not cumulative.isdigit():
+            continue
+        # A package's root import covers all of its submodules, wherever it was first pulled in
+        if "." not in name:
+            totals[name] = max(totals.get(name, 0), int(cumulative))
+    ranked = sorted(totals.items(), key=lambda kv: -kv[1])[:top]
+    return [{"package": pkg, "cumulative_ms": round(us / 1000, 1)} for pkg, us in ranked]
+
+
+def measure_startup(kind: str, api_base: str) -> Dict[str, Any]:
+    code = CHILD.format(kind=kind, api_base=api_base)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, timeout=600)
+    timings = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            timings = {k: round(v, 3) for k, v in json.loads(line[len("STARTUP "):]).items()}
+    if proc.returncode != 0 or not timings:
+        # Keep the child's full traceback, without the -X importtime lines around it
+        output = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"Startup run failed (exit {proc.returncode}):\n{output.strip()}")
+    return {"agent": kind, **timings, "imports": parse_importtime(proc.stderr)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of an agent")
+    parser.add_argument("--agent", choices=STUB_AGENTS, default="simple")
+    parser.add_argument("--target-s", type=float, default=3.0, help="Budget for time to first answer")
+    args = parser.parse_args()
+
+    with StubLLMServer() as stub:
+        api_base = stub.url.rsplit("/api/", 1)[0]
+        result = measure_startup(args.agent, api_base)
+
+    print(json.dumps(result, indent=2))
+    if result["total_s"] > args.target_s:
+        print(f"Cold start {result['total_s']}s exceeds target {args.target_s}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
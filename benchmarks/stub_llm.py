@@ -0,0 +1,198 @@
+"""Local stand-in for Ollama's /api/generate so the pipeline can be benchmarked offline.
+
+Responses come from (in order of precedence):
+- rules: JSONL entries with a "match" substring, answered whenever the prompt contains it
+- replay: JSONL entries without "match", returned in order (cycling)
+- built-in canned answers for SQL generation and synthesis prompts
+
+Latency is simulated as prefill_latency * prompt_tokens + token_latency * response_tokens.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+CANNED_SQL = {"sql": "SELECT c.CategoryName, SUM(od.Quantity) AS Total FROM Categories c JOIN Products p ON c.CategoryID = p.CategoryID JOIN \"Order Details\" od ON p.ProductID = od.ProductID GROUP BY c.CategoryName ORDER BY Total DESC LIMIT 1"}
+CANNED_ANSWER = {"final_answer": 0, "citations": ["Orders"]}
+
+# Agents the stub can serve. The hybrid agent's DSPy modules call a different endpoint
+# and expect `[[ ## field ## ]]`-formatted completions, which the stub doesn't produce.
+STUB_AGENTS = ("simple",)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for llama-family tokenizers
+    return max(1, len(text) // 4)
+
+
+def load_responses(path: str):
+    rules, replay = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry["response"]
+            if not isinstance(response, str):
+                response = json.dumps(response)
+            if entry.get("match"):
+                rules.append((entry["match"], response))
+            else:
+                replay.append(response)
+    return rules, replay
+
+
+class StubLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_latency: float = 0.0,
+                 prefill_latency: float = 0.0, responses_path: Optional[str] = None):
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.rules: List = []
+        self.replay: List[str] = []
+        if responses_path:
+            self.rules, self.replay = load_responses(responses_path)
+        self._replay_iter = itertools.cycle(self.replay) if self.replay else None
+        self._lock = threading.Lock()
+        self.requests_served = 0
+        self.requests_cancelled = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def respond(self, prompt: str) -> str:
+        for match, response in self.rules:
+            if match in prompt:
+                return response
+        with self._lock:
+            if self._replay_iter is not None:
+                return next(self._replay_iter)
+        if '"sql"' in prompt:
+            return json.dumps(CANNED_SQL)
+        return json.dumps(CANNED_ANSWER)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path in ("/", "/api/version"):
+                    self._send_json(200, {"version": "stub"})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server.generate(self, payload)
+
+        return Handler
+
+    def generate(self, handler: BaseHTTPRequestHandler, payload: Dict):
+        start = time.perf_counter()
+        prompt = payload.get("prompt", "")
+        text = self.respond(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+        # Split into roughly token-sized pieces for streaming
+        pieces = [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
+
+        prefill = self.prefill_latency * prompt_tokens
+        time.sleep(prefill)
+        with self._lock:
+            self.requests_served += 1
+
+        def final(extra: Dict) -> Dict:
+            now = time.perf_counter()
+            return {
+                "model": payload.get("model", "stub"),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "done": True,
+                "done_reason": "stop",
+                "context": list(range(prompt_tokens + len(pieces))),
+                "total_duration": int((now - start) * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int(max(0.0, now - start - prefill) * 1e9),
+                **extra,
+            }
+
+        if payload.get("stream", True):
+            # Ollama streams NDJSON; HTTP/1.0 lets us end the body by closing
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/x-ndjson")
+            handler.end_headers()
+            try:
+                for piece in pieces:
+                    time.sleep(self.token_latency)
+                    chunk = {"model": payload.get("model", "stub"), "response": piece, "done": False}
+                    handler.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                    handler.wfile.flush()
+                handler.wfile.write((json.dumps(final({"response": ""})) + "\n").encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                # Client closed the stream, as Ollama clients do to cancel a generation
+                with self._lock:
+                    self.requests_cancelled += 1
+        else:
+            time.sleep(self.token_latency * len(pieces))
+            handler._send_json(200, final({"response": text}))
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama /api/generate server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per generated token")
+    parser.add_argument("--prefill-latency", type=float, default=0.0005, help="Seconds per prompt token")
+    parser.add_argument("--responses", help="JSONL of {match?, response} rules / replayed responses")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.token_latency, args.prefill_latency, args.responses)
+    print(f"Stub LLM listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
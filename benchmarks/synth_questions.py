@@ -0,0 +1,62 @@
+"""Scale sample_questions_hybrid_eval.jsonl into a large synthetic workload."""
+import argparse
+import json
+import random
+from typing import Dict, List
+
+CATEGORIES = ["Beverages", "Condiments", "Confections", "Dairy Products", "Grains/Cereals",
+              "Meat/Poultry", "Produce", "Seafood"]
+CAMPAIGNS = ["Summer Beverages 1997", "Winter Classics 1997"]
+YEARS = ["1996", "1997", "1998"]
+
+TEMPLATES = [
+    ("rag", "According to the product policy, what is the return window (days) for unopened {category}? Return an integer.", "int"),
+    ("hybrid", "During '{campaign}' as defined in the marketing calendar, which product category had the highest total quantity sold? Return {{category:str, quantity:int}}.", "{category:str, quantity:int}"),
+    ("hybrid", "Using the AOV definition from the KPI docs, what was the Average Order Value during '{campaign}'? Return a float rounded to 2 decimals.", "float"),
+    ("sql", "Top {n} products by total revenue in {year}. Revenue uses Order Details: SUM(UnitPrice*Quantity*(1-Discount)). Return list[{{product:str, revenue:float}}].", "list[{product:str, revenue:float}]"),
+    ("hybrid", "Total revenue from the '{category}' category during '{campaign}' dates. Return a float rounded to 2 decimals.", "float"),
+    ("hybrid", "Per the KPI definition of gross margin, who was the top customer by gross margin in {year}? Assume CostOfGoods is approximated by 70% of UnitPrice if not available. Return {{customer:str, margin:float}}.", "{customer:str, margin:float}"),
+    ("sql", "How many orders were placed in {year}? Return an integer.", "int"),
+]
+
+
+def load_seed(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def generate(count: int, seed_path: str = "sample_questions_hybrid_eval.jsonl", seed: int = 0) -> List[Dict]:
+    """Return `count` questions: the originals first, then templated variants."""
+    rng = random.Random(seed)
+    items = load_seed(seed_path)[:count]
+    i = 0
+    while len(items) < count:
+        kind, template, format_hint = TEMPLATES[i % len(TEMPLATES)]
+        question = template.format(
+            category=rng.choice(CATEGORIES),
+            campaign=rng.choice(CAMPAIGNS),
+            year=rng.choice(YEARS),
+            n=rng.choice([3, 5, 10]),
+        )
+        items.append({"id": f"synth_{kind}_{i:05d}", "question": question, "format_hint": format_hint})
+        i += 1
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic question workload")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed-file", default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    items = generate(args.count, args.seed_file, args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+    print(f"Wrote {len(items)} questions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,55 @@
 import argparse
 import json
-import dspy
-import os
-from agent.graph_hybrid import HybridAgent
 
 def main():
     parser = argparse.ArgumentParser(description="Retail Analytics Copilot")
     parser.add_argument("--batch", required=True, help="Path to input JSONL file")
     parser.add_argument("--out", required=True, help="Path to output JSONL file")
+    parser.add_argument("--agent", choices=["simple", "hybrid"], default="simple", help="Agent implementation to run")
+    parser.add_argument("--api-base", default="http://localhost:11434", help="Ollama base URL")
+    parser.add_argument("--trace", help="Write per-stage trace spans to this JSONL file")
+    parser.add_argument("--chrome-trace", help="Write a Chrome trace-event JSON file (chrome://tracing / Perfetto)")
+    parser.add_argument("--model-profile", default="default", help="Per-stage model profile: default or tiered")
+    parser.add_argument("--model", action="append", metavar="STAGE=M1,M2", help="Override a stage's model chain (repeatable)")
+    parser.add_argument("--sql-candidates", type=int, default=1, help="Number of SQL candidates to sample in parallel (first valid wins; simple agent only)")
+    parser.add_argument("--kpi-engine", action="store_true", help="Answer recognised KPI questions from the columnar KPI cache instead of generated SQL")
+    parser.add_argument("--server", help="Send questions to a running agent server (e.g. http://127.0.0.1:8765) instead of loading an agent")
     args = parser.parse_args()
 
-    # Use SimpleAgent instead of HybridAgent
-    from agent.simple_agent import SimpleAgent
-    agent = SimpleAgent()
+    from agent.tracing import Tracer
+    tracer = Tracer()
+    if args.server:
+        import time
+        import requests
+        session = requests.Session()
+
+        def answer(item):
+            # Back off while the server's worker queue is full
+            for attempt in range(5):
+                response = session.post(f"{args.server.rstrip('/')}/ask", json=item)
+                if response.status_code != 503:
+                    break
+                time.sleep(0.5 * 2 ** attempt)
+            result = response.json()
+            if response.status_code != 200:
+                raise RuntimeError(result.get("error", f"HTTP {response.status_code}"))
+            return result
+    else:
+        # Heavy dependencies (dspy/langgraph for hybrid) are imported by the factory on demand
+        from agent.factory import create_agent
+        from agent.model_config import parse_model_overrides
+        agent = create_agent(
+            args.agent,
+            tracer=tracer,
+            model_profile=args.model_profile,
+            model_overrides=parse_model_overrides(args.model),
+            api_base=args.api_base,
+            sql_candidates=args.sql_candidates,
+            kpi_engine=args.kpi_engine
+        )
+
+        def answer(item):
+            return agent.run(item["question"], item["format_hint"])
     
     # Clear output file first
     with open(args.out, "w") as f:
@@ -27,8 +64,8 @@ def main():
             print(f"Processing: {item['id']}")
             
             try:
-                # Run the simple agent
-                result = agent.run(item["question"], item["format_hint"])
+                with tracer.span("question", trace=item["id"]):
+                    result = answer(item)
                 
                 output = {
                     "id": item["id"],
@@ -56,5 +93,17 @@ def main():
 
     print(f"Results written to {args.out}")
 
+    tracer.print_summary(by="model")
+    if not args.server and getattr(agent, "repair_cache", None) is not None:
+        stats = agent.repair_cache.stats()
+        print(f"Repair cache: {stats['llm_calls_saved']} LLM repair calls saved, "
+              f"{stats['hits']}/{stats['lookups']} hits, {stats['evictions']} evicted, {stats['entries']} entries")
+    if args.trace:
+        tracer.export_jsonl(args.trace)
+        print(f"Trace written to {args.trace}")
+    if args.chrome_trace:
+        tracer.export_chrome(args.chrome_trace)
+        print(f"Chrome trace written to {args.chrome_trace}")
+
 if __name__ == "__main__":
     main()
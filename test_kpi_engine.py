@@ -0,0 +1,171 @@
+"""Parity of agent/tools/kpi_engine.py against SQL on a synthetic Northwind database.
+
+    python -m pytest -q test_kpi_engine.py
+"""
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from agent.tools.kpi_engine import KPIEngine
+
+CATEGORIES = ["Beverages", "Condiments", "Confections", "Dairy Products",
+              "Grains/Cereals", "Meat/Poultry", "Produce", "Seafood"]
+
+JOINS = """FROM "Order Details" od
+    JOIN Orders o ON od.OrderID = o.OrderID
+    JOIN Products p ON p.ProductID = od.ProductID
+    JOIN Categories c ON c.CategoryID = p.CategoryID
+    JOIN Customers cu ON cu.CustomerID = o.CustomerID"""
+REVENUE = "od.UnitPrice * od.Quantity * (1 - od.Discount)"
+KPI_SQL = {
+    "revenue": f"SUM({REVENUE})",
+    "aov": f"SUM({REVENUE}) / COUNT(DISTINCT o.OrderID)",
+    "orders": "COUNT(DISTINCT o.OrderID)",
+    "quantity": "SUM(od.Quantity)",
+    "gross_margin": "SUM((od.UnitPrice - 0.7 * od.UnitPrice) * od.Quantity * (1 - od.Discount))",
+}
+GROUP_SQL = {"category": "c.CategoryName", "product": "p.ProductName", "customer": "cu.CompanyName"}
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("northwind") / "northwind.sqlite")
+    conn = sqlite3.connect(path)
+    rng = random.Random(0)
+    conn.executescript("""
+        CREATE TABLE Orders (OrderID INTEGER, CustomerID TEXT, OrderDate TEXT);
+        CREATE TABLE "Order Details" (OrderID INTEGER, ProductID INTEGER, UnitPrice REAL, Quantity INTEGER, Discount REAL);
+        CREATE TABLE Products (ProductID INTEGER, ProductName TEXT, CategoryID INTEGER);
+        CREATE TABLE Categories (CategoryID INTEGER, CategoryName TEXT);
+        CREATE TABLE Customers (CustomerID TEXT, CompanyName TEXT);
+    """)
+    conn.executemany("INSERT INTO Categories VALUES (?, ?)", list(enumerate(CATEGORIES, 1)))
+    conn.executemany("INSERT INTO Products VALUES (?, ?, ?)",
+                     [(i, f"Item {i}", rng.randint(1, len(CATEGORIES))) for i in range(1, 78)])
+    conn.executemany("INSERT INTO Customers VALUES (?, ?)", [(f"C{i}", f"Company {i}") for i in range(90)])
+    for order_id in range(10248, 10248 + 830):
+        day = np.datetime64("1996-07-04") + rng.randint(0, 670)
+        conn.execute("INSERT INTO Orders VALUES (?, ?, ?)", (order_id, f"C{rng.randint(0, 89)}", f"{day} 00:00:00"))
+        # Several lines per order, spread across categories
+        for product in rng.sample(range(1, 78), rng.randint(1, 6)):
+            conn.execute('INSERT INTO "Order Details" VALUES (?, ?, ?, ?, ?)',
+                         (order_id, product, round(rng.uniform(2, 260), 2), rng.randint(1, 120),
+                          rng.choice([0, 0, 0.05, 0.1, 0.25])))
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def engine(db, tmp_path_factory):
+    path = db.execute("PRAGMA database_list").fetchone()[2]
+    return KPIEngine(path, cache_dir=str(tmp_path_factory.mktemp("kpi_cache")))
+
+
+def sql_kpi(db, kpi, start=None, end=None, group_by=None, filters=None):
+    where, params = [], []
+    if start:
+        where.append("date(o.OrderDate) BETWEEN ? AND ?")
+        params += [start, end]
+    for dim, label in (filters or {}).items():
+        where.append(f"{GROUP_SQL[dim]} = ?")
+        params.append(label)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    if group_by:
+        rows = db.execute(f"SELECT {GROUP_SQL[group_by]}, {KPI_SQL[kpi]} {JOINS} {clause} GROUP BY 1", params)
+        return dict(rows.fetchall())
+    return db.execute(f"SELECT {KPI_SQL[kpi]} {JOINS} {clause}", params).fetchone()[0]
+
+
+def engine_kpi(engine, kpi, start=None, end=None, group_by=None, filters=None):
+    result = engine.compute(kpi, start, end, group_by=group_by, filters=filters)
+    assert result["error"] is None
+    column = result["columns"][-1]
+    if group_by:
+        return {row[result["columns"][0]]: row[column] for row in result["rows"]}
+    return result["rows"][0][column]
+
+
+def assert_close(actual, expected):
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected)
+        for key in expected:
+            assert_close(actual[key], expected[key])
+    else:
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-6)
+
+
+@pytest.mark.parametrize("kpi", ["aov", "orders", "revenue", "quantity", "gross_margin"])
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_category_filtered_kpi_matches_sql(db, engine, kpi, category):
+    window = ("1997-06-01", "1997-06-30")
+    filters = {"category": category}
+    assert_close(engine_kpi(engine, kpi, *window, filters=filters), sql_kpi(db, kpi, *window, filters=filters))
+
+
+@pytest.mark.parametrize("kpi", ["aov", "orders", "revenue", "quantity", "gross_margin"])
+@pytest.mark.parametrize("group_by", [None, "category", "product", "customer"])
+@pytest.mark.parametrize("filters", [None, {"category": "Seafood"}, {"category": "Dairy Products"},
+                                     {"product": "Item 5"}, {"customer": "Company 3"}])
+def test_grouped_kpi_matches_sql(db, engine, kpi, group_by, filters):
+    for window in ((None, None), ("1997-01-01", "1997-12-31")):
+        expected = sql_kpi(db, kpi, *window, group_by=group_by, filters=filters)
+        if expected is None:
+            continue
+        assert_close(engine_kpi(engine, kpi, *window, group_by=group_by, filters=filters), expected)
+
+
+def test_cache_reloads_memory_mapped(engine):
+    engine.load()
+    reloaded = KPIEngine(engine.db_path, cache_dir=engine.cache_dir)
+    reloaded.load()
+    assert isinstance(reloaded.columns["revenue"], np.memmap)
+    assert reloaded.compute("aov", group_by="category") == engine.compute("aov", group_by="category")
+
+
+@pytest.mark.parametrize("question", [
+    "Total revenue for product P5 in 1997?",
+    "What was the revenue from customer Co3 in 1997?",
+    "How many orders did customer Co1 place in 1997?",
+    "Total revenue from 'Nonexistent Category' in 1997.",
+    "Revenue by supplier in 1997?",
+    "What is the return window for unopened Beverages?",
+    "Top 3 customers by revenue in 1997 excluding Beverages",
+    "Total revenue between 1997-03-01 and 1997-05-31",
+    "revenue in Q3 1997",
+    "Total revenue in the first half of 1997",
+    "Total revenue in summer 1997",
+    "Revenue from Beverages in 1996 vs 1997",
+    "average quantity per order in 1997",
+    "revenue in June 1997 for discounted orders",
+    "Revenue in June and July 1997",
+    "How many orders were placed in June?",
+    "Which customers had revenue over 1000 in 1997?",
+])
+def test_unresolved_constraints_fall_back_to_sql(engine, question):
+    assert engine.match(question) is None
+    assert engine.answer(question) is None
+
+
+def test_named_entities_become_filters(db, engine):
+    spec = engine.match("Total revenue for product Item 5 in 1997?")
+    assert spec["filters"] == {"product": "Item 5"} and spec["group_by"] is None
+    spec = engine.match("How many orders did customer Company 3 place in 1997?")
+    assert spec["kpi"] == "orders" and spec["filters"] == {"customer": "Company 3"}
+    _, result = engine.answer("What was the revenue from customer Company 3 in 1997?")
+    expected = sql_kpi(db, "revenue", "1997-01-01", "1997-12-31", filters={"customer": "Company 3"})
+    assert_close(result["rows"][0]["Revenue"], expected)
+
+
+def test_eval_questions_match(engine):
+    spec = engine.match("During 'Summer Beverages 1997' as defined in the marketing calendar, which product "
+                        "category had the highest total quantity sold? Return {category:str, quantity:int}.")
+    assert (spec["kpi"], spec["start"], spec["end"], spec["group_by"], spec["top"], spec["filters"]) == \
+        ("quantity", "1997-06-01", "1997-06-30", "category", 1, {})
+    spec = engine.match("Total revenue from the 'Beverages' category during 'Summer Beverages 1997' dates.")
+    assert spec["filters"] == {"category": "Beverages"} and spec["group_by"] is None
+    spec = engine.match("Top 3 products by total revenue all-time. Revenue uses Order Details: "
+                        "SUM(UnitPrice*Quantity*(1-Discount)).")
+    assert (spec["kpi"], spec["group_by"], spec["top"], spec["start"]) == ("revenue", "product", 3, None)